@@ -1,17 +1,49 @@
+import http.client
+import itertools
+import json
+import math
 import os
+import queue
+import socket
 import sys
-
-import google.generativeai as genai
-from PySide6.QtCore import Qt, QTimer, QThread, Signal, QRect
-from PySide6.QtGui import QPainter, QColor, QPen, QFont, QFontDatabase
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit
+
+_IMPORT_START = time.perf_counter()  # --profile-startup：从这里开始计 Qt 的导入耗时
+
+from PySide6.QtCore import Qt, QObject, QTimer, Signal, QEvent, QRect, QRectF, QPointF
+from PySide6.QtGui import (QPainter, QColor, QPen, QFont, QFontMetrics, QPixmap, QRegion,
+                           QKeySequence, QShortcut)
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QHBoxLayout, QPushButton, QLabel, QLineEdit,
-                               QListWidget, QFrame)
+                               QListWidget, QListWidgetItem, QFrame, QMenu)
+
+_IMPORT_END = time.perf_counter()
 
 # --- 配置 ---
 API_KEY = os.getenv("API_KEY") or ""
-if API_KEY:
-    genai.configure(api_key=API_KEY)
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def load_genai():
+    """第一次真正请求 AI 时才导入 google.generativeai
+
+    这个 SDK 导入要花数百毫秒，放在模块顶部会拖慢每次启动（即使没有配置 API_KEY）。
+    在 AIService 的请求线程 (run) 或预取线程 (run_prefetch) 里调用，不阻塞界面。
+    """
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=API_KEY)
+            _genai = genai
+    return _genai
 
 # --- 配色与样式 ---
 COLORS = {
@@ -91,33 +123,685 @@ QListWidget::item:selected {{ background-color: rgba(225, 29, 72, 0.15); color:
 """
 
 
-# --- AI 线程 ---
-class AIWorker(QThread):
-    finished = Signal(str)
+# --- AI 服务 ---
+def build_prompt(mode, task_name=""):
+    if mode == "break":
+        return f"I finished: '{task_name}'. Suggest a 5-min break (under 15 words)."
+    return "One short, powerful focus tip (under 10 words)."
 
-    def __init__(self, task_name, mode="break"):
-        super().__init__()
-        self.task_name = task_name
-        self.mode = mode
+
+class AIProvider:
+    """AI 提供方接口
+
+    generate(mode, task_name, timeout) 返回一句建议，失败或超时抛异常。
+    联网的提供方只需实现 complete(prompt, timeout)；cacheable=False 表示结果
+    本来就是即时的，AIService 不必缓存或预取。
+    """
+    name = "base"
+    cacheable = True
+
+    def generate(self, mode, task_name="", timeout=None):
+        return self.complete(build_prompt(mode, task_name), timeout)
+
+    def complete(self, prompt, timeout=None):
+        raise NotImplementedError
+
+
+class GeminiProvider(AIProvider):
+    """google.generativeai 提供方
+
+    GenerativeModel 只在第一次请求时创建一次，之后复用它和它底层的客户端连接，
+    不必每次请求都重新建客户端、握手 TLS。只在 AIService 的工作线程里使用。
+    """
+    name = "gemini"
+    MODEL_NAME = os.getenv("FOCUSFLOW_GEMINI_MODEL", 'gemini-2.5-flash')
+
+    def __init__(self):
+        self._model = None
+
+    def complete(self, prompt, timeout=None):
+        if self._model is None:
+            self._model = load_genai().GenerativeModel(self.MODEL_NAME)
+        options = {"timeout": timeout} if timeout else None
+        return self._model.generate_content(prompt, request_options=options).text.strip()
+
+
+class OpenAICompatibleProvider(AIProvider):
+    """OpenAI 兼容的 /chat/completions 接口（如本机的 Ollama、llama.cpp server）
+
+    每个线程保持一条 HTTP keep-alive 连接反复使用；出错时关掉，下次请求重新连接。
+    http.client 把请求头和请求体分两次发送，连接上要关掉 Nagle，
+    否则复用连接时每个请求都要多等一次延迟 ACK（约 40ms）。
+    """
+    name = "openai"
+    BASE_URL = os.getenv("FOCUSFLOW_AI_URL", "http://localhost:11434/v1")
+    MODEL_NAME = os.getenv("FOCUSFLOW_AI_MODEL", "llama3.2")
+
+    def __init__(self, base_url=None, model=None, api_key=None):
+        parts = urlsplit(base_url or self.BASE_URL)
+        self._https = parts.scheme == "https"
+        self._netloc = parts.netloc
+        self._path = parts.path.rstrip("/") + "/chat/completions"
+        self.model = model or self.MODEL_NAME
+        self.api_key = api_key or os.getenv("FOCUSFLOW_AI_API_KEY", "")
+        self._local = threading.local()  # AIService 的请求线程和预取线程各用各的连接
+
+    def complete(self, prompt, timeout=None):
+        body = json.dumps({"model": self.model, "max_tokens": 60,
+                           "messages": [{"role": "user", "content": prompt}]})
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            conn = self._local.conn = conn_class(self._netloc)
+        try:
+            if conn.sock is None:
+                conn.timeout = timeout
+                conn.connect()
+                conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.sock.settimeout(timeout)
+            conn.request("POST", self._path, body, headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+        return json.loads(data)["choices"][0]["message"]["content"].strip()
+
+
+class TemplateProvider(AIProvider):
+    """内置模板，不联网、零延迟：离线使用，也是请求超时 / 失败时的本地兜底"""
+    name = "template"
+    cacheable = False
+
+    BREAKS = ["Stand up, stretch, and refill your water.",
+              "Look at something far away for a minute.",
+              "Take a short walk and breathe deeply.",
+              "Roll your shoulders and rest your eyes."]
+    TIPS = ["One task. Full attention.",
+            "Start small, keep moving.",
+            "Close the tabs you don't need.",
+            "Take a deep breath."]
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def generate(self, mode, task_name="", timeout=None):
+        choices = self.BREAKS if mode == "break" else self.TIPS
+        return choices[next(self._counter) % len(choices)]
+
+
+PROVIDERS = {cls.name: cls for cls in (GeminiProvider, OpenAICompatibleProvider, TemplateProvider)}
+
+
+def create_provider(name=None):
+    """按名字创建提供方；默认读 FOCUSFLOW_AI_PROVIDER，未设置时有 API_KEY 才用 Gemini"""
+    name = name or os.getenv("FOCUSFLOW_AI_PROVIDER") or ("gemini" if API_KEY else "")
+    provider_class = PROVIDERS.get(name)
+    return provider_class() if provider_class else None
+
+
+def write_json_atomic(path, data):
+    """先写 path.tmp 再替换，写到一半崩溃也不会留下残缺的文件；失败时抛出 OSError"""
+    tmp_name = path + ".tmp"
+    with open(tmp_name, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_name, path)
+
+
+class ResponseCache:
+    """AI 回复缓存：内存 LRU + 磁盘 JSON，键为 (模式, 归一化后的任务名)
+
+    每个键下是一小池还没展示过的回复，取出即消耗，同一条建议不会反复出现；
+    超过 TTL 的回复直接丢弃。UI 线程取，AIService 工作线程放入和写盘，所有操作加锁。
+    """
+    MAX_KEYS = 64
+    POOL_SIZE = 3
+    TTL = int(os.getenv("FOCUSFLOW_AI_CACHE_TTL", str(12 * 3600)))  # 秒
+    FILE_NAME = os.getenv("FOCUSFLOW_AI_CACHE", "focusflow_ai_cache.json")
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or self.FILE_NAME
+        self.ttl = self.TTL if ttl is None else ttl
+        self._pools = OrderedDict()  # key -> [[写入时间, 文本], ...]，最近使用的在末尾
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # 两个工作线程都会写盘，共用同一个临时文件
+        self._dirty = False
+
+    @staticmethod
+    def make_key(mode, task_name=""):
+        return mode, " ".join(task_name.casefold().split())
+
+    def _fresh_pool(self, key, now):
+        """去掉过期项后的回复池（调用时已持有锁）"""
+        pool = self._pools.get(key)
+        if pool is None:
+            return []
+        fresh = [entry for entry in pool if now - entry[0] < self.ttl]
+        if len(fresh) == len(pool):
+            return pool
+        self._dirty = True
+        if fresh:
+            self._pools[key] = fresh
+        else:
+            del self._pools[key]
+        return fresh
+
+    def take(self, mode, task_name=""):
+        """取出一条未过期的回复；没有时返回 None"""
+        key = self.make_key(mode, task_name)
+        with self._lock:
+            pool = self._fresh_pool(key, time.time())
+            if not pool:
+                return None
+            _, text = pool.pop(0)
+            if pool:
+                self._pools.move_to_end(key)
+            else:
+                del self._pools[key]
+            self._dirty = True
+            return text
+
+    def put(self, mode, task_name, text):
+        key = self.make_key(mode, task_name)
+        with self._lock:
+            pool = self._pools.setdefault(key, [])
+            pool.append([time.time(), text])
+            del pool[:-self.POOL_SIZE]
+            self._pools.move_to_end(key)
+            while len(self._pools) > self.MAX_KEYS:
+                self._pools.popitem(last=False)
+            self._dirty = True
+
+    def size(self, mode, task_name=""):
+        with self._lock:
+            return len(self._fresh_pool(self.make_key(mode, task_name), time.time()))
+
+    def load(self):
+        """读入磁盘缓存；文件缺失、损坏或结构不对时当作空缓存"""
+        now = time.time()
+        pools = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            for mode, task_name, pool in entries:
+                fresh = [[float(stamp), str(text)] for stamp, text in pool
+                         if now - float(stamp) < self.ttl]
+                if fresh:
+                    pools[(mode, task_name)] = fresh
+        except (OSError, ValueError, TypeError):
+            return
+        with self._lock:
+            self._pools.update(pools)
+
+    def save(self):
+        """有改动时写盘（先写临时文件再替换）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = [[mode, task_name, list(pool)] for (mode, task_name), pool in self._pools.items()]
+            self._dirty = False
+        with self._save_lock:
+            try:
+                write_json_atomic(self.path, entries)
+            except OSError:
+                pass  # 缓存丢了只是少几条现成的建议
+
+
+class AIService(QObject):
+    """常驻的 AI 服务：用户请求和后台预取各有一个工作线程，各自按顺序处理
+
+    shared() 第一次调用时才创建并启动（线程安全），之后所有请求共用这两个线程和
+    同一个提供方 (AIProvider)，同时最多两个网络请求。request() 立即返回请求编号，
+    结果通过 finished(编号, 文本) 送回，每个编号只送回一次：
+    - 相同 (模式, 任务) 的请求还没完成时直接合并，返回同一个编号；
+    - cancel() 放弃请求：还在排队的不再发送，已发出的结果只进缓存；
+    - 每个请求有截止时间，到点还没结果就先送回本地建议，迟到的回复留进缓存。
+    prefetch() 在另一个线程里把回复预先放进 ResponseCache，正在进行的慢预取不会
+    让用户请求错过截止时间；cached() 命中时界面可以立即显示，不必等网络往返。
+    request() / cancel() 需在 UI 线程调用（截止计时用 QTimer）。
+    工作线程是守护线程：stop() 最多等 STOP_TIMEOUT_MS 让它们写完缓存，仍卡在网络请求里
+    就不再等，随进程退出（不强行终止正在执行 Python 代码的线程）。
+    也可以直接 AIService(provider) 创建一个独立实例，见 tests/test_ai_service.py。
+    """
+    finished = Signal(int, str)
+
+    NO_KEY_TEXT = "Tip: Configure API Key for AI suggestions."
+    DEADLINE_MS = int(os.getenv("FOCUSFLOW_AI_TIMEOUT_MS", "6000"))
+    PREFETCH_TIMEOUT = 20  # 秒；预取不急，但也不能无限占着预取线程
+    MIN_TIMEOUT = 0.5
+    STOP_TIMEOUT_MS = 3000
+    # 请求队列优先级：数字小的先处理
+    PRIORITY_STOP, PRIORITY_USER = 0, 1
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, provider=None, cache=None, parent=None):
+        super().__init__(parent)
+        self.provider = provider
+        self._fallback = TemplateProvider()
+        self.cache = cache
+        self._queue = queue.PriorityQueue()
+        self._seq = 0  # 同一优先级内保持先进先出
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._pending = {}  # 未送回结果的请求编号 -> 缓存键
+        self._inflight = {}  # 缓存键 -> 请求编号，用于合并相同请求
+        self._prefetching = {}  # 缓存键 -> 已排队的预取数
+        self._prefetch_queue = queue.Queue()
+        self._cache_loaded = threading.Event()
+        self._threads = [threading.Thread(target=self.run, name="AIService", daemon=True),
+                         threading.Thread(target=self.run_prefetch, name="AIService-prefetch", daemon=True)]
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(create_provider(), ResponseCache())
+                cls._shared.start()
+            return cls._shared
+
+    @classmethod
+    def shutdown(cls):
+        """退出时调用；服务从未创建过时什么也不做"""
+        with cls._shared_lock:
+            service, cls._shared = cls._shared, None
+        if service is not None:
+            service.stop()
+
+    def _put(self, priority, item):
+        with self._lock:
+            self._seq += 1
+            self._queue.put((priority, self._seq, item))
+
+    def request(self, mode, task_name="", deadline_ms=None):
+        key = ResponseCache.make_key(mode, task_name)
+        deadline_ms = self.DEADLINE_MS if deadline_ms is None else deadline_ms
+        with self._lock:
+            request_id = self._inflight.get(key)
+            if request_id is not None:
+                return request_id  # 相同的请求还没完成，合并
+            self._next_id += 1
+            request_id = self._next_id
+            self._pending[request_id] = key
+            self._inflight[key] = request_id
+        self._put(self.PRIORITY_USER,
+                  (request_id, mode, task_name, time.monotonic() + deadline_ms / 1000))
+        QTimer.singleShot(deadline_ms, lambda: self._expire(request_id, mode, task_name))
+        return request_id
+
+    def cancel(self, request_id):
+        with self._lock:
+            self._claim(request_id)
+
+    def _claim(self, request_id):
+        """认领送回结果的资格（调用时已持有锁）；已送回或已取消时返回 False"""
+        key = self._pending.pop(request_id, None)
+        if key is None:
+            return False
+        if self._inflight.get(key) == request_id:
+            del self._inflight[key]
+        return True
+
+    def _expire(self, request_id, mode, task_name):
+        with self._lock:
+            claimed = self._claim(request_id)
+        if claimed:
+            self.finished.emit(request_id, self.fallback_text(mode, task_name))
+
+    def fallback_text(self, mode, task_name=""):
+        if self.provider is None:
+            return self.NO_KEY_TEXT
+        return self._fallback.generate(mode, task_name)
+
+    def caching(self):
+        return self.cache is not None and self.provider is not None and self.provider.cacheable
+
+    def cached(self, mode, task_name=""):
+        """从缓存取一条回复；不需要缓存（未配置提供方、模板提供方）时返回 None"""
+        if not self.caching():
+            return None
+        return self.cache.take(mode, task_name)
+
+    def prefetch(self, mode, task_name="", count=1):
+        """把 (mode, task_name) 的缓存补到 count 条（已排队的预取也算在内）"""
+        if not self.caching():
+            return
+        key = ResponseCache.make_key(mode, task_name)
+        with self._lock:
+            missing = count - self.cache.size(mode, task_name) - self._prefetching.get(key, 0)
+            if missing <= 0:
+                return
+            self._prefetching[key] = self._prefetching.get(key, 0) + missing
+        for _ in range(missing):
+            self._prefetch_queue.put((mode, task_name))
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """请求退出并等工作线程结束；返回它们是否都已结束"""
+        self._put(self.PRIORITY_STOP, None)
+        self._prefetch_queue.put(None)
+        deadline = time.monotonic() + self.STOP_TIMEOUT_MS / 1000
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join(max(deadline - time.monotonic(), 0))
+        return not any(thread.is_alive() for thread in self._threads)
 
     def run(self):
-        if not API_KEY:
-            self.finished.emit("Tip: Configure API Key for AI suggestions.")
+        """请求线程：处理用户请求"""
+        try:
+            if self.cache is not None:
+                self.cache.load()
+        finally:
+            self._cache_loaded.set()  # 无论如何都放行预取线程
+        while True:
+            _, _, item = self._queue.get()
+            if item is None:
+                break
+            self._serve(*item)
+            if self.cache is not None and self._queue.empty():
+                self.cache.save()  # 空闲时写盘
+        if self.cache is not None:
+            self.cache.save()
+
+    def run_prefetch(self):
+        """预取线程：缓存读入之后才开始补充"""
+        self._cache_loaded.wait()
+        while True:
+            item = self._prefetch_queue.get()
+            if item is None:
+                break
+            self._prefetch_one(*item)
+            if self._prefetch_queue.empty():
+                self.cache.save()
+
+    def _serve(self, request_id, mode, task_name, deadline):
+        with self._lock:
+            if request_id not in self._pending:
+                return  # 排队期间已被取消或超时，不再发送
+        text = self.call_provider(mode, task_name, max(deadline - time.monotonic(), self.MIN_TIMEOUT))
+        with self._lock:
+            claimed = self._claim(request_id)
+        if claimed:
+            self.finished.emit(request_id, text or self.fallback_text(mode, task_name))
+        elif text and self.caching():
+            self.cache.put(mode, task_name, text)  # 超时后才到的回复留给下次
+
+    def _prefetch_one(self, mode, task_name):
+        text = self.call_provider(mode, task_name, self.PREFETCH_TIMEOUT)
+        if text:  # 失败的预取不缓存，下次再补
+            self.cache.put(mode, task_name, text)
+        key = ResponseCache.make_key(mode, task_name)
+        with self._lock:
+            self._prefetching[key] -= 1
+            if not self._prefetching[key]:
+                del self._prefetching[key]
+
+    def call_provider(self, mode, task_name="", timeout=None):
+        """调用提供方生成回复；没有提供方、超时或出错时返回 None"""
+        if self.provider is None:
+            return None
+        try:
+            return self.provider.generate(mode, task_name, timeout)
+        except Exception:
+            return None
+
+
+# --- 会话记录与统计 ---
+class SessionLog:
+    """专注 / 休息会话的追加日志：每行一个 JSON 记录，写入后立即 fsync
+
+    记录字段：id, mode ("focus" / "break"), task, planned / actual (秒),
+    interruptions (暂停次数), started / ended (时间戳), completed (是否计时到点)。
+    """
+    FILE_NAME = os.getenv("FOCUSFLOW_SESSION_LOG", "focusflow_sessions.jsonl")
+
+    def __init__(self, path=None):
+        self.path = path or self.FILE_NAME
+
+    def append(self, record):
+        """追加一条记录，返回追加后的文件长度；写入失败时截掉写了一半的行再抛出 OSError"""
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.path, 'ab') as f:
+            start = f.tell()
+            try:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError:
+                f.truncate(start)  # 否则下一条记录会接在残行后面，一起被丢弃
+                raise
+            return f.tell()
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def read_from(self, offset=0):
+        """从字节位置 offset 开始逐条产出 (记录, 该行结束的位置)；末尾写了一半的行忽略"""
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
             return
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                yield record, offset
+
+
+class StatsEngine:
+    """会话统计：按天、按 ISO 周和总计增量累加，连续专注天数随记录顺带维护
+
+    汇总连同已处理到的日志位置存在 focusflow_stats.json 里。启动时读汇总，再补上
+    日志里新增的部分；查询今天 / 本周 / 连续天数都是字典查找，与历史长短无关。
+    汇总文件丢失、损坏或与日志对不上（日志被截断）时从日志整体重建。
+    """
+    FILE_NAME = os.getenv("FOCUSFLOW_STATS", "focusflow_stats.json")
+
+    def __init__(self, log, path=None):
+        self.log = log
+        self.path = path or self.FILE_NAME
+        self._reset()
+
+    def _reset(self):
+        self.days = {}
+        self.weeks = {}
+        self.totals = self._bucket()
+        self.streak = 0
+        self.best_streak = 0
+        self.last_focus_day = None
+        self.log_offset = 0
+
+    @staticmethod
+    def _bucket():
+        return {"focus": 0, "break": 0, "sessions": 0, "interruptions": 0}
+
+    @staticmethod
+    def week_key(day):
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+
+    def load(self):
         try:
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            if self.mode == "break":
-                prompt = f"I finished: '{self.task_name}'. Suggest a 5-min break (under 15 words)."
-            else:
-                prompt = "One short, powerful focus tip (under 10 words)."
-            response = model.generate_content(prompt)
-            self.finished.emit(response.text.strip())
-        except:
-            self.finished.emit("Take a deep breath.")
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.days, self.weeks, self.totals = data["days"], data["weeks"], data["totals"]
+            self.streak, self.best_streak = data["streak"], data["best_streak"]
+            self.last_focus_day, self.log_offset = data["last_focus_day"], data["log_offset"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self._reset()
+        if self.log_offset > self.log.size():
+            self._reset()
+        changed = False
+        for record, offset in self.log.read_from(self.log_offset):
+            self._fold(record)
+            self.log_offset = offset
+            changed = True
+        if changed:
+            self.save()
+
+    def save(self):
+        data = {"days": self.days, "weeks": self.weeks, "totals": self.totals,
+                "streak": self.streak, "best_streak": self.best_streak,
+                "last_focus_day": self.last_focus_day, "log_offset": self.log_offset}
+        try:
+            write_json_atomic(self.path, data)
+        except OSError:
+            pass  # 汇总随时可以从日志重建
+
+    def record(self, record):
+        """写入日志并累加到汇总；日志写不进去时（磁盘满、没有权限）只计入内存中的统计"""
+        try:
+            self.log_offset = self.log.append(record)
+        except OSError:
+            pass
+        self._fold(record)
+        self.save()
+
+    def _fold(self, record):
+        day = datetime.fromtimestamp(record["ended"]).date()
+        kind = "focus" if record["mode"] == "focus" else "break"
+        counted = kind == "focus" and record.get("completed")
+        for bucket in (self.days.setdefault(day.isoformat(), self._bucket()),
+                       self.weeks.setdefault(self.week_key(day), self._bucket()),
+                       self.totals):
+            bucket[kind] += record["actual"]
+            bucket["interruptions"] += record.get("interruptions", 0)
+            if counted:
+                bucket["sessions"] += 1
+        if counted:
+            self._extend_streak(day)
+
+    def _extend_streak(self, day):
+        last = date.fromisoformat(self.last_focus_day) if self.last_focus_day else None
+        if last is not None and day <= last:
+            return
+        self.streak = self.streak + 1 if last is not None and (day - last).days == 1 else 1
+        self.best_streak = max(self.best_streak, self.streak)
+        self.last_focus_day = day.isoformat()
+
+    # --- 查询（常数时间）---
+    def day(self, day=None):
+        return self.days.get((day or date.today()).isoformat(), self._bucket())
+
+    def week(self, day=None):
+        return self.weeks.get(self.week_key(day or date.today()), self._bucket())
+
+    def current_streak(self, today=None):
+        """今天或昨天有完成的专注时连续天数才算数"""
+        today = today or date.today()
+        if self.last_focus_day in (today.isoformat(), (today - timedelta(days=1)).isoformat()):
+            return self.streak
+        return 0
+
+
+def format_duration(seconds):
+    minutes = int(seconds) // 60
+    return f"{minutes // 60}h {minutes % 60:02d}m" if minutes >= 60 else f"{minutes}m"
+
+
+# --- 任务队列 ---
+class TaskQueue:
+    """FocusFlow 的锚点任务：按顺序保存，每个任务有稳定的 id，当前任务记 id 而不是行号
+
+    存在 focusflow_tasks.json 里（整体写临时文件再替换），重启后任务和当前任务都还在。
+    """
+    FILE_NAME = os.getenv("FOCUSFLOW_TASKS", "focusflow_tasks.json")
+
+    def __init__(self, path=None):
+        self.path = path or self.FILE_NAME
+        self.tasks = {}  # id -> {"id", "text", "created"}
+        self.order = []
+        self.active_id = None
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        return (self.tasks[task_id] for task_id in self.order)
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            tasks = {task["id"]: task for task in data["tasks"]}
+            order = [task["id"] for task in data["tasks"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        self.tasks, self.order = tasks, order
+        self.active_id = data.get("active") if data.get("active") in tasks else None
+
+    def save(self):
+        """写盘；失败时抛出 OSError，由界面提示并重试"""
+        data = {"active": self.active_id, "tasks": [self.tasks[task_id] for task_id in self.order]}
+        write_json_atomic(self.path, data)
+
+    def add(self, text):
+        task = {"id": uuid.uuid4().hex, "text": text, "created": time.time()}
+        self.tasks[task["id"]] = task
+        self.order.append(task["id"])
+        return task
+
+    def text(self, task_id):
+        return self.tasks[task_id]["text"]
+
+    def set_active(self, task_id):
+        self.active_id = task_id
+
+    def move(self, task_ids, row):
+        """把 task_ids（原本相邻）整体移到第 row 位（移动之后的位置）"""
+        moving = set(task_ids)
+        rest = [task_id for task_id in self.order if task_id not in moving]
+        rest[row:row] = task_ids
+        self.order = rest
+
+    def remove(self, task_id):
+        """删除任务；删的是当前任务时清空当前任务"""
+        del self.tasks[task_id]
+        self.order.remove(task_id)
+        if self.active_id == task_id:
+            self.active_id = None
 
 
 # --- 圆形进度条 (紧凑版) ---
 class ProgressRing(QWidget):
+    """圆形进度条
+
+    不随进度变化的部分（背景环、各状态文字、"MM:SS" 用到的字形）预先渲染成
+    QPixmap，只在尺寸、调色板 / 样式或缩放比例变化时重建；每次重绘只画一段
+    进度弧再贴几张小图。FOCUSFLOW_PAINT_DEBUG=1 时在左上角显示每次绘制的耗时。
+
+    平滑模式 (FOCUSFLOW_SMOOTH_RING=1) 下进度弧在两次整秒之间也连续移动：帧间隔
+    按弧端每帧移动约 FRAME_STEP_PX 像素计算，不超过屏幕刷新率，也不低于 1Hz；
+    每帧只重绘弧端新旧位置所在的小块区域。窗口隐藏、最小化或被完全遮挡时停止动画，
+    下次真正重绘时再恢复。
+    """
+    RING_SIZE = 170  # 绘图区域缩小
+    RING_WIDTH = 8  # 线条变细
+    TIME_GLYPHS = "0123456789:"
+    PAINT_DEBUG = os.getenv("FOCUSFLOW_PAINT_DEBUG") == "1"
+    CACHE_EVENTS = (QEvent.PaletteChange, QEvent.StyleChange, QEvent.FontChange)
+    SMOOTH = os.getenv("FOCUSFLOW_SMOOTH_RING") == "1"
+    FRAME_STEP_PX = 0.25
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setFixedSize(200, 200)  # 缩小尺寸
@@ -126,51 +810,333 @@ class ProgressRing(QWidget):
         self.status = "READY"
         self.is_active = False
 
+        self.fg_pen = QPen(QColor(COLORS['primary']))
+        self.fg_pen.setWidth(self.RING_WIDTH)
+        self.fg_pen.setCapStyle(Qt.RoundCap)
+        self.debug_font = QFont("Consolas", 7)
+        self._static = None  # 背景环
+        self._glyphs = None  # 字符 -> (pixmap, 占位宽度)
+        self._status_pixmaps = {}
+        self._ratio = 0
+        self._time_top = 0
+        self._time_rect = QRect()
+        self._status_rect = QRect()
+
+        # 平滑动画
+        self.smooth = self.SMOOTH
+        self._fraction_source = None  # 返回当前精确进度 (0~1) 的函数
+        self._anim = QTimer(self)
+        self._anim.setTimerType(Qt.PreciseTimer)
+        self._anim.timeout.connect(self._animate_frame)
+
+        # 绘制耗时统计
+        self.paint_count = 0
+        self.paint_total = 0.0
+        self.last_paint = 0.0
+
     def update_progress(self, time_left, total_time, is_active):
-        self.text = f"{time_left // 60:02d}:{time_left % 60:02d}"
-        self.percentage = time_left / total_time if total_time > 0 else 0
-        self.status = "RUNNING" if is_active else ("PAUSED" if time_left < total_time else "READY")
+        text = f"{time_left // 60:02d}:{time_left % 60:02d}"
+        status = "RUNNING" if is_active else ("PAUSED" if time_left < total_time else "READY")
         self.is_active = is_active
-        self.update()
+        if self._static is None:
+            self.text, self.status = text, status
+            self.percentage = time_left / total_time if total_time > 0 else 0
+            self.update()
+            return
+        dirty = QRegion()
+        if text != self.text:
+            self.text = text
+            dirty += self._time_rect
+        if status != self.status:
+            self.status = status
+            dirty += self._status_rect
+        if self._fraction_source is None:  # 动画进行中由每帧负责进度弧
+            percentage = time_left / total_time if total_time > 0 else 0
+            dirty += self.arc_dirty_rect(self.percentage, percentage)
+            self.percentage = percentage
+        self._update_region(dirty)
+
+    # --- 平滑动画 ---
+    def start_animation(self, fraction_source, total_seconds):
+        if not self.smooth or total_seconds <= 0:
+            return
+        self._fraction_source = fraction_source
+        px_per_second = math.pi * self.RING_SIZE / total_seconds
+        screen = self.screen()
+        frame_ms = 1000 / (screen.refreshRate() if screen and screen.refreshRate() > 0 else 60)
+        self._anim.setInterval(round(min(1000, max(frame_ms, 1000 * self.FRAME_STEP_PX / px_per_second))))
+        if self._can_animate():
+            self._anim.start()
+
+    def stop_animation(self):
+        self._fraction_source = None
+        self._anim.stop()
+
+    def _can_animate(self):
+        window = self.window()
+        handle = window.windowHandle()
+        return (self.isVisible() and not window.isMinimized()
+                and handle is not None and handle.isExposed())
+
+    def _animate_frame(self):
+        if not self._can_animate():
+            self._anim.stop()  # 重新显示后的第一次 paintEvent 会恢复
+            return
+        self.set_fraction(self._fraction_source())
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing)
+    def set_fraction(self, percentage):
+        if percentage != self.percentage:
+            dirty = self.arc_dirty_rect(self.percentage, percentage)
+            self.percentage = percentage
+            self._update_region(QRegion(dirty))
 
-        w, h = self.width(), self.height()
-        rect_size = 170  # 绘图区域缩小
-        x, y = (w - rect_size) / 2, (h - rect_size) / 2
+    def _update_region(self, dirty):
+        if dirty.isEmpty():
+            return
+        if self.PAINT_DEBUG:
+            dirty += QRect(0, 0, self.width(), 16)  # 调试信息也要跟着刷新
+        self.update(dirty)
+
+    def arc_dirty_rect(self, old, new):
+        """进度从 old 变到 new 时需要重绘的区域：弧端新旧两处的圆头；变化较大时整个环"""
+        margin = self.RING_WIDTH / 2 + 2
+        ring = self.ring_rect().adjusted(-margin, -margin, margin, margin)
+        if old == new:
+            return QRect()
+        if abs(old - new) > 0.02 or new <= 0 or old <= 0:
+            return ring.toAlignedRect()
+        center, radius = ring.center(), self.RING_SIZE / 2
+        rect = QRectF()
+        for fraction in (old, new):
+            angle = math.radians(90 - fraction * 360)
+            end = QPointF(center.x() + radius * math.cos(angle), center.y() - radius * math.sin(angle))
+            rect = rect.united(QRectF(end.x() - margin, end.y() - margin, 2 * margin, 2 * margin))
+        return rect.toAlignedRect()
+
+    def ring_rect(self):
+        x, y = (self.width() - self.RING_SIZE) / 2, (self.height() - self.RING_SIZE) / 2
+        return QRectF(x, y, self.RING_SIZE, self.RING_SIZE)
+
+    # --- 静态层缓存 ---
+    def invalidate_cache(self):
+        self._static = None
+        self._glyphs = None
+        self._status_pixmaps = {}
+        self.update()
 
-        # 背景
+    def resizeEvent(self, event):
+        self.invalidate_cache()
+        super().resizeEvent(event)
+
+    def changeEvent(self, event):
+        if event.type() in self.CACHE_EVENTS:
+            self.invalidate_cache()
+        super().changeEvent(event)
+
+    def _new_pixmap(self, width, height):
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(max(1, round(width * ratio)), max(1, round(height * ratio)))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+        return pixmap
+
+    def _build_cache(self):
+        self._ratio = self.devicePixelRatioF()
+        self._static = self._new_pixmap(self.width(), self.height())
+        painter = QPainter(self._static)
+        painter.setRenderHint(QPainter.Antialiasing)
         pen_bg = QPen(QColor(COLORS['surface']))
-        pen_bg.setWidth(8)  # 线条变细
+        pen_bg.setWidth(self.RING_WIDTH)
         pen_bg.setCapStyle(Qt.RoundCap)
         painter.setPen(pen_bg)
-        painter.drawEllipse(x, y, rect_size, rect_size)
+        painter.drawEllipse(self.ring_rect())
+        painter.end()
+
+        # 时间数字：每个字符单独渲染一次；数字统一按最宽的数字占位，跳秒时文字不左右晃动
+        font = QFont("Consolas", 36, QFont.Bold)  # 字体缩小
+        metrics = QFontMetrics(font)
+        digit_width = max(metrics.horizontalAdvance(ch) for ch in "0123456789")
+        self._time_top = (self.height() - metrics.height()) / 2
+        self._time_rect = QRect(0, math.floor(self._time_top), self.width(), metrics.height() + 2)
+        ring_top = (self.height() - self.RING_SIZE) / 2
+        self._status_rect = QRect(0, math.floor(ring_top + 110), self.width(), 31)
+        self._glyphs = {}
+        for ch in self.TIME_GLYPHS:
+            width = digit_width if ch.isdigit() else metrics.horizontalAdvance(ch)
+            pixmap = self._new_pixmap(width, metrics.height())
+            painter = QPainter(pixmap)
+            painter.setRenderHint(QPainter.TextAntialiasing)
+            painter.setFont(font)
+            painter.setPen(QColor(COLORS['text_main']))
+            painter.drawText(QRectF(0, 0, width, metrics.height()), Qt.AlignCenter, ch)
+            painter.end()
+            self._glyphs[ch] = (pixmap, width)
+
+    def _status_pixmap(self, status):
+        pixmap = self._status_pixmaps.get(status)
+        if pixmap is None:
+            # 状态小字
+            font = QFont("Segoe UI", 9, QFont.Bold)
+            font.setLetterSpacing(QFont.AbsoluteSpacing, 1)
+            pixmap = self._new_pixmap(self.width(), 30)
+            painter = QPainter(pixmap)
+            painter.setFont(font)
+            painter.setPen(QColor(COLORS['text_dim']))
+            painter.drawText(QRect(0, 0, self.width(), 30), Qt.AlignCenter, status)
+            painter.end()
+            self._status_pixmaps[status] = pixmap
+        return pixmap
+
+    # --- 绘制 ---
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        if self._static is None or self._ratio != self.devicePixelRatioF():
+            self._build_cache()
+        if self._fraction_source is not None and not self._anim.isActive():
+            self._anim.start()  # 窗口重新可见
+
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._static)
 
         # 进度
         if self.percentage > 0:
-            pen_fg = QPen(QColor(COLORS['primary']))
-            pen_fg.setWidth(8)
-            pen_fg.setCapStyle(Qt.RoundCap)
-            painter.setPen(pen_fg)
-            painter.drawArc(x, y, rect_size, rect_size, 90 * 16, -self.percentage * 360 * 16)
-
-        # 文字
-        painter.setPen(QColor(COLORS['text_main']))
-        painter.setFont(QFont("Consolas", 36, QFont.Bold))  # 字体缩小
-        painter.drawText(self.rect(), Qt.AlignCenter, self.text)
-
-        # 状态小字
-        painter.setPen(QColor(COLORS['text_dim']))
-        f_status = QFont("Segoe UI", 9, QFont.Bold)
-        f_status.setLetterSpacing(QFont.AbsoluteSpacing, 1)
-        painter.setFont(f_status)
-        painter.drawText(QRect(0, y + 110, w, 30), Qt.AlignCenter, self.status)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setPen(self.fg_pen)
+            painter.drawArc(self.ring_rect(), 90 * 16, round(-self.percentage * 360 * 16))
+
+        # 文字：逐个贴预渲染的字形
+        glyphs = [self._glyphs.get(ch) for ch in self.text]
+        if None in glyphs:
+            painter.setPen(QColor(COLORS['text_main']))
+            painter.setFont(QFont("Consolas", 36, QFont.Bold))
+            painter.drawText(self.rect(), Qt.AlignCenter, self.text)
+        else:
+            x = (self.width() - sum(width for _, width in glyphs)) / 2
+            for pixmap, width in glyphs:
+                painter.drawPixmap(QPointF(x, self._time_top), pixmap)
+                x += width
+
+        ring_top = (self.height() - self.RING_SIZE) / 2
+        painter.drawPixmap(QPointF(0, ring_top + 110), self._status_pixmap(self.status))
+
+        elapsed = time.perf_counter() - start
+        self.paint_count += 1
+        self.paint_total += elapsed
+        self.last_paint = elapsed
+        if self.PAINT_DEBUG:
+            painter.setFont(self.debug_font)
+            painter.setPen(QColor(COLORS['text_dim']))
+            painter.drawText(4, 12, f"#{self.paint_count} {elapsed * 1e6:.0f}µs "
+                                    f"avg {self.paint_total / self.paint_count * 1e6:.0f}µs")
+        painter.end()
+
+
+# --- 计时引擎 ---
+if hasattr(time, "CLOCK_BOOTTIME"):
+    def _clock():
+        """Linux 上 monotonic 在系统挂起期间停走，BOOTTIME 会把挂起的时间也算上"""
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+else:
+    _clock = time.monotonic
+
+
+class CountdownEngine(QObject):
+    """基于截止时刻的倒计时
+
+    运行时只记住结束时刻，剩余时间每次都由时钟算出，事件循环卡顿、定时器
+    迟到都不会累积误差。定时器是单次的，对准下一个整秒边界触发（剩余秒数
+    变化的那一刻），而不是固定每 1000ms 一次。最小化时改用粗粒度定时器，
+    每 COARSE_INTERVAL 秒醒一次，只有最后一段用精确定时器对准结束时刻。
+    系统挂起恢复后的第一次唤醒（或 refresh()）会直接追上真实剩余时间。
+    """
+    tick = Signal(int)  # 剩余秒数（向上取整）变化时发出
+    finished = Signal()
+
+    BOUNDARY_SLACK = 0.005  # 稍晚于边界触发，保证取整后的秒数已经变化
+    COARSE_INTERVAL = 30
+
+    def __init__(self, total_seconds, parent=None):
+        super().__init__(parent)
+        self.total = total_seconds
+        self.coarse = False
+        self._remaining = float(total_seconds)
+        self._deadline = None  # 运行中时为结束时刻
+        self._last_tick = total_seconds
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.refresh)
+
+    @property
+    def is_running(self):
+        return self._deadline is not None
+
+    def remaining(self):
+        if self._deadline is None:
+            return self._remaining
+        return max(self._deadline - _clock(), 0.0)
+
+    def reset(self, total_seconds):
+        self._timer.stop()
+        self._deadline = None
+        self.total = total_seconds
+        self._remaining = float(total_seconds)
+        self._last_tick = total_seconds
+
+    def start(self):
+        if self._deadline is None and self._remaining > 0:
+            self._deadline = _clock() + self._remaining
+            self._schedule(self._remaining)
+
+    def pause(self):
+        if self._deadline is not None:
+            self._remaining = self.remaining()
+            self._deadline = None
+            self._timer.stop()
+
+    def set_coarse(self, coarse):
+        """窗口最小化时传 True：不需要每秒刷新界面"""
+        if coarse != self.coarse:
+            self.coarse = coarse
+            self.refresh()
+
+    def refresh(self):
+        """按时钟重新计算剩余时间，必要时发出 tick / finished 并安排下一次唤醒"""
+        if self._deadline is None:
+            return
+        left = self.remaining()
+        if left <= 0:
+            self._deadline = None
+            self._remaining = 0.0
+            self._timer.stop()
+            self._emit_tick(0)
+            self.finished.emit()
+            return
+        self._emit_tick(math.ceil(left))
+        self._schedule(left)
+
+    def _emit_tick(self, seconds):
+        if seconds != self._last_tick:
+            self._last_tick = seconds
+            self.tick.emit(seconds)
+
+    def _schedule(self, left):
+        if self.coarse and left > self.COARSE_INTERVAL:
+            self._timer.setTimerType(Qt.CoarseTimer)
+            delay = min(self.COARSE_INTERVAL, left - self.COARSE_INTERVAL)
+        elif self.coarse:
+            self._timer.setTimerType(Qt.PreciseTimer)
+            delay = left  # 最后一段直接对准结束时刻
+        else:
+            self._timer.setTimerType(Qt.PreciseTimer)
+            delay = left - (math.ceil(left) - 1)  # 下一个整秒边界
+        self._timer.start(max(1, math.ceil((delay + self.BOUNDARY_SLACK) * 1000)))
 
 
 # --- 主窗口 ---
 class FocusFlowWindow(QMainWindow):
+    TASKS_SAVE_MS = 500
+    TASKS_RETRY_MS = 2000  # 任务写盘失败后隔多久再试
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("FocusFlow")
@@ -182,13 +1148,25 @@ class FocusFlowWindow(QMainWindow):
 
         self.total_time = 25 * 60
         self.time_left = self.total_time
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.on_tick)
-        self.is_running = False
-        self.active_task_index = -1
-
-        self.setup_ui()
+        self.engine = CountdownEngine(self.total_time, self)
+        self.engine.tick.connect(self.on_tick)
+        self.engine.finished.connect(self.on_finished)
+        self.mode = "focus"
+        self.session = None  # 进行中的会话记录，第一次开始计时时创建
+        self._run_started = None
+        self.stats = None  # 第一次需要时才读取统计汇总
+        self.tasks = TaskQueue()
+        self.task_items = {}  # 任务 id -> 列表项，切换当前任务时只改前后两行
+        self.tasks_save_timer = QTimer(self)  # 连续改动合并成一次写盘，关闭窗口时立即写
+        self.tasks_save_timer.setSingleShot(True)
+        self.tasks_save_timer.setInterval(self.TASKS_SAVE_MS)
+        self.tasks_save_timer.timeout.connect(self.save_tasks)
+        self.ai_service = None
+        self.ai_request = None  # 只显示最近一次请求的结果
+
+        # 先设样式表再创建控件：子控件创建时直接套用，不必事后整体重新 polish 一遍
         self.setStyleSheet(STYLESHEET)
+        self.setup_ui()
 
     def setup_ui(self):
         central_widget = QWidget()
@@ -325,13 +1303,35 @@ class FocusFlowWindow(QMainWindow):
 
         # 列表
         self.task_list = QListWidget()
+        self.task_list.setUniformItemSizes(True)
+        self.task_list.setDragDropMode(QListWidget.InternalMove)
         self.task_list.itemDoubleClicked.connect(self.activate_task)
+        self.task_list.model().rowsMoved.connect(self.on_tasks_moved)
+        self.task_list.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.task_list.customContextMenuRequested.connect(self.show_task_menu)
+        delete_shortcut = QShortcut(QKeySequence.Delete, self.task_list, self.delete_current_task)
+        delete_shortcut.setContext(Qt.WidgetShortcut)  # 只在列表有焦点时生效，不影响输入框
         right_layout.addWidget(self.task_list)
+        self.load_tasks()
+
+        self.lbl_tasks_error = QLabel()
+        self.lbl_tasks_error.setStyleSheet(f"color: {COLORS['accent']}; font-size: 10px;")
+        self.lbl_tasks_error.setWordWrap(True)
+        self.lbl_tasks_error.setVisible(False)
+        right_layout.addWidget(self.lbl_tasks_error)
 
-        r_hint = QLabel("Double-click to set active.")
+        r_hint = QLabel("Double-click: set active · Right-click: done / delete")
         r_hint.setStyleSheet("color: #64748b; font-size: 10px;")
         right_layout.addWidget(r_hint)
 
+        # 统计
+        s_title = QLabel("STATS")
+        s_title.setStyleSheet(f"color: {COLORS['text_dim']}; font-weight: bold; font-size: 11px; letter-spacing: 1px;")
+        right_layout.addWidget(s_title)
+        self.lbl_stats = QLabel()
+        self.lbl_stats.setStyleSheet(f"color: {COLORS['text_main']}; font-size: 11px;")
+        right_layout.addWidget(self.lbl_stats)
+
         self.main_layout.addWidget(self.line)
         self.main_layout.addWidget(self.right_widget, stretch=1)
 
@@ -345,6 +1345,7 @@ class FocusFlowWindow(QMainWindow):
         if show:
             self.resize(self.expanded_width, self.height_size)
             self.btn_tasks.setText("Hide")
+            self.refresh_stats()
         else:
             self.resize(self.compact_width, self.height_size)
             self.btn_tasks.setText("Tasks")
@@ -353,11 +1354,13 @@ class FocusFlowWindow(QMainWindow):
         self.btn_focus.setChecked(mode == "FOCUS")
         self.btn_break.setChecked(mode == "BREAK")
         self.set_duration(25 if mode == "FOCUS" else 5)
+        self.mode = mode.lower()
 
     def set_duration(self, minutes):
-        self.timer.stop()
-        self.is_running = False
+        self.end_session(completed=False)
         self.total_time = minutes * 60
+        self.engine.reset(self.total_time)
+        self.ring.stop_animation()
         self.time_left = self.total_time
         self.btn_toggle.setText("Start")
         self.ring.update_progress(self.time_left, self.total_time, False)
@@ -371,72 +1374,365 @@ class FocusFlowWindow(QMainWindow):
             pass
 
     def toggle_timer(self):
-        if self.is_running:
-            self.timer.stop()
-            self.is_running = False
+        if self.engine.is_running:
+            self.engine.pause()
+            self.pause_session()
+            self.ring.stop_animation()
             self.btn_toggle.setText("Resume")
         else:
-            self.timer.start(1000)
-            self.is_running = True
-            self.btn_toggle.setText("Pause")
-        self.ring.update_progress(self.time_left, self.total_time, self.is_running)
+            if self.engine.remaining() <= 0:
+                # 上一轮已经到点：Start 重新开始一轮
+                self.engine.reset(self.total_time)
+                self.time_left = self.total_time
+            self.engine.start()
+            if self.engine.is_running:  # 真正开始计时才记会话、切换按钮
+                self.resume_session()
+                self.ring.start_animation(lambda: self.engine.remaining() / self.total_time, self.total_time)
+                self.btn_toggle.setText("Pause")
+                self.prefetch_ai()
+        self.ring.update_progress(self.time_left, self.total_time, self.engine.is_running)
 
     def reset_timer(self):
         self.set_duration(self.total_time // 60)
         self.lbl_ai.setText("Ready to flow?")
 
-    def on_tick(self):
-        if self.time_left > 0:
-            self.time_left -= 1
-            self.ring.update_progress(self.time_left, self.total_time, True)
-        else:
-            self.timer.stop()
-            self.is_running = False
-            self.btn_toggle.setText("Start")
-            self.ring.update_progress(0, self.total_time, False)
-            QApplication.beep()
-            self.on_complete()
+    def on_tick(self, seconds_left):
+        self.time_left = seconds_left
+        self.ring.update_progress(self.time_left, self.total_time, self.engine.is_running)
+
+    def on_finished(self):
+        self.end_session(completed=True)
+        self.ring.stop_animation()
+        self.btn_toggle.setText("Start")
+        self.ring.update_progress(0, self.total_time, False)
+        QApplication.beep()
+        self.on_complete()
+
+    def closeEvent(self, event):
+        self.end_session(completed=False)
+        if self.tasks_save_timer.isActive():
+            self.tasks_save_timer.stop()
+            self.save_tasks()
+        super().closeEvent(event)
+
+    # --- 会话记录 ---
+
+    def resume_session(self):
+        if self.session is None:
+            self.session = {"id": uuid.uuid4().hex, "mode": self.mode,
+                            "task": self.active_task_name() if self.tasks.active_id else "",
+                            "planned": self.total_time, "actual": 0.0, "interruptions": 0,
+                            "started": time.time()}
+        self._run_started = _clock()
+
+    def pause_session(self):
+        if self._run_started is not None:
+            self.session["actual"] += _clock() - self._run_started
+            self.session["interruptions"] += 1
+            self._run_started = None
+
+    def end_session(self, completed):
+        """计时到点或被放弃（重置、换时长、关闭窗口）时写一条会话记录"""
+        if self.session is None:
+            return
+        if self._run_started is not None:
+            self.session["actual"] += _clock() - self._run_started
+            self._run_started = None
+        session, self.session = self.session, None
+        session.update(actual=round(session["actual"], 1), ended=time.time(), completed=completed)
+        self.get_stats().record(session)
+        if self.right_widget.isVisible():
+            self.refresh_stats()
+
+    def get_stats(self):
+        if self.stats is None:
+            self.stats = StatsEngine(SessionLog())
+            self.stats.load()
+        return self.stats
+
+    def refresh_stats(self):
+        stats = self.get_stats()
+        today, week = stats.day(), stats.week()
+        self.lbl_stats.setText(
+            f"Today  {format_duration(today['focus'])} · {today['sessions']} sessions\n"
+            f"This week  {format_duration(week['focus'])} · {week['sessions']} sessions\n"
+            f"Streak  {stats.current_streak()} days · best {stats.best_streak}")
+
+    def changeEvent(self, event):
+        if event.type() == QEvent.WindowStateChange:
+            self.engine.set_coarse(self.isMinimized())
+        elif event.type() == QEvent.ActivationChange:
+            self.engine.refresh()  # 例如从挂起恢复后回到窗口：立即追上真实时间
+        super().changeEvent(event)
 
     # --- 任务与 AI ---
 
+    def load_tasks(self):
+        self.tasks.load()
+        for task in self.tasks:
+            self.add_task_item(task)
+        active = self.task_items.get(self.tasks.active_id)
+        if active is not None:
+            self.style_task_item(active, True)
+
+    def add_task_item(self, task):
+        item = QListWidgetItem(task["text"])
+        item.setData(Qt.UserRole, task["id"])
+        self.style_task_item(item, False)
+        self.task_list.addItem(item)
+        self.task_items[task["id"]] = item
+        return item
+
+    @staticmethod
+    def style_task_item(item, active):
+        item.setBackground(QColor(COLORS['primary']) if active else QColor(COLORS['surface']))
+        item.setForeground(QColor('white') if active else QColor(COLORS['text_dim']))
+
     def add_task(self):
         text = self.task_input.text().strip()
         if text:
-            self.task_list.addItem(text)
+            item = self.add_task_item(self.tasks.add(text))
             self.task_input.clear()
-            if self.task_list.count() == 1:
-                self.activate_task(self.task_list.item(0))
+            if len(self.tasks) == 1:
+                self.activate_task(item)
+            else:
+                self.tasks_save_timer.start()
 
     def activate_task(self, item):
-        self.active_task_index = self.task_list.row(item)
-        for i in range(self.task_list.count()):
-            it = self.task_list.item(i)
-            it.setBackground(QColor(COLORS['surface']) if i != self.active_task_index else QColor(COLORS['primary']))
-            it.setForeground(QColor(COLORS['text_dim']) if i != self.active_task_index else QColor('white'))
+        task_id = item.data(Qt.UserRole)
+        previous = self.task_items.get(self.tasks.active_id)
+        if previous is not None and previous is not item:
+            self.style_task_item(previous, False)
+        self.style_task_item(item, True)
+        self.tasks.set_active(task_id)
+        self.tasks_save_timer.start()
+        self.prefetch_ai()
+
+    def show_task_menu(self, pos):
+        item = self.task_list.itemAt(pos)
+        if item is None:
+            return
+        menu = QMenu(self)
+        menu.addAction("Set active", lambda: self.activate_task(item))
+        menu.addAction("Done", lambda: self.complete_task(item))
+        menu.addAction("Delete", lambda: self.remove_task(item))
+        menu.exec(self.task_list.viewport().mapToGlobal(pos))
+
+    def delete_current_task(self):
+        item = self.task_list.currentItem()
+        if item is not None:
+            self.remove_task(item)
+
+    def complete_task(self, item):
+        """完成任务：移出队列；完成的是当前任务时，接着的下一个任务成为当前任务"""
+        was_active = item.data(Qt.UserRole) == self.tasks.active_id
+        row = self.remove_task(item)
+        if was_active and self.task_list.count():
+            self.activate_task(self.task_list.item(min(row, self.task_list.count() - 1)))
+
+    def remove_task(self, item):
+        """删除一行，返回它原来的行号"""
+        task_id = item.data(Qt.UserRole)
+        row = self.task_list.row(item)
+        self.task_list.takeItem(row)
+        del self.task_items[task_id]
+        self.tasks.remove(task_id)
+        self.tasks_save_timer.start()
+        return row
+
+    def on_tasks_moved(self, parent, start, end, destination, row):
+        """拖动排序后同步任务顺序；row 是移动前的插入位置"""
+        count = end - start + 1
+        new_row = row if row < start else row - count
+        moved = [self.task_list.item(i).data(Qt.UserRole) for i in range(new_row, new_row + count)]
+        self.tasks.move(moved, new_row)
+        self.tasks_save_timer.start()
+
+    def save_tasks(self):
+        """任务写盘；失败时在任务面板提示，稍后再试，内存里的改动不会丢"""
+        try:
+            self.tasks.save()
+        except OSError as e:
+            self.lbl_tasks_error.setText(f"⚠ Couldn't save tasks, retrying: {e}")
+            self.lbl_tasks_error.setVisible(True)
+            self.tasks_save_timer.start(self.TASKS_RETRY_MS)
+            return
+        self.lbl_tasks_error.setVisible(False)
+        self.tasks_save_timer.setInterval(self.TASKS_SAVE_MS)
+
+    def active_task_name(self):
+        if self.tasks.active_id:
+            return self.tasks.text(self.tasks.active_id)
+        return "Work"
 
     def on_complete(self):
         self.activateWindow()
-        self.lbl_ai.setText("Thinking...")
-        task = "Work"
-        if self.active_task_index >= 0:
-            task = self.task_list.item(self.active_task_index).text()
-
-        self.worker = AIWorker(task, "break")
-        self.worker.finished.connect(lambda t: self.lbl_ai.setText(t))
-        self.worker.start()
+        self.ask_ai("break", self.active_task_name(), "Thinking...")
 
     def request_motivation(self):
-        self.lbl_ai.setText("Connecting to AI...")
-        self.worker = AIWorker("", "tip")
-        self.worker.finished.connect(lambda t: self.lbl_ai.setText(t))
-        self.worker.start()
+        self.ask_ai("tip", "", "Connecting to AI...")
+
+    def get_ai_service(self):
+        if self.ai_service is None:
+            self.ai_service = AIService.shared()
+            self.ai_service.finished.connect(self.on_ai_result)
+        return self.ai_service
+
+    def ask_ai(self, mode, task_name, waiting_text):
+        """有预取好的回复就立即显示，否则显示等待文字并发起请求"""
+        service = self.get_ai_service()
+        previous = self.ai_request
+        text = service.cached(mode, task_name)
+        if text is None:
+            self.lbl_ai.setText(waiting_text)
+            self.ai_request = service.request(mode, task_name)
+        else:
+            self.ai_request = None
+            self.lbl_ai.setText(text)
+        if previous is not None and previous != self.ai_request:
+            service.cancel(previous)  # 被新请求取代
+        self.prefetch_ai()
+
+    def prefetch_ai(self):
+        """计时进行中时在后台补满提示池，并预取当前任务完成后的休息建议"""
+        if not self.engine.is_running:
+            return
+        service = self.get_ai_service()
+        service.prefetch("tip", "", ResponseCache.POOL_SIZE)
+        service.prefetch("break", self.active_task_name())
+
+    def on_ai_result(self, request_id, text):
+        if request_id == self.ai_request:
+            self.ai_request = None
+            self.lbl_ai.setText(text)
+
+
+def bench_providers(names=None, count=20):
+    """--bench-ai [名字...]：依次调用各提供方 count 次，打印延迟分布"""
+    for name in names or PROVIDERS:
+        if name not in PROVIDERS:
+            print(f"{name:<10} unknown provider (choose from {', '.join(PROVIDERS)})")
+            continue
+        if name == "gemini" and not API_KEY:
+            print(f"{name:<10} skipped: API_KEY not set")
+            continue
+        provider = PROVIDERS[name]()
+        latencies = []
+        try:
+            for i in range(count):
+                t = time.perf_counter()
+                provider.generate("break" if i % 2 else "tip", "Write report",
+                                  AIService.DEADLINE_MS / 1000)
+                latencies.append(time.perf_counter() - t)
+        except Exception as exc:
+            print(f"{name:<10} error after {len(latencies)} calls: {exc!r}")
+            continue
+        latencies.sort()
+        print(f"{name:<10} n={count}  min {latencies[0] * 1000:.3f}ms  "
+              f"median {latencies[count // 2] * 1000:.3f}ms  max {latencies[-1] * 1000:.3f}ms")
+
+
+def bench_ring_cpu(seconds=5.0):
+    """--bench-ring [秒]：对比各刷新模式的 CPU 占用和重绘次数
+
+    计时设为 1 分钟，平滑模式下弧端移动最快、帧率最高，是最坏情况。
+    """
+    app = QApplication.instance() or QApplication(sys.argv)
+    modes = [("paused (idle)", False, True, False),
+             ("tick 1 Hz", False, True, True),
+             ("smooth, visible", True, True, True),
+             ("smooth, hidden", True, False, True)]
+    for label, smooth, visible, running in modes:
+        window = FocusFlowWindow()
+        window.ring.smooth = smooth
+        window.set_duration(1)
+        if visible:
+            window.show()
+        if running:
+            window.engine.start()
+            window.ring.start_animation(lambda w=window: w.engine.remaining() / w.total_time,
+                                        window.total_time)
+        paints = window.ring.paint_count
+        cpu, wall = time.process_time(), time.perf_counter()
+        QTimer.singleShot(round(seconds * 1000), app.quit)
+        app.exec()
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+        paints = window.ring.paint_count - paints
+        print(f"{label:<18} cpu {cpu / wall * 100:5.1f}%  paints {paints:5d} ({paints / wall:5.1f}/s)  "
+              f"frame interval {window.ring._anim.interval() if smooth else 1000}ms")
+        window.engine.reset(0)
+        window.ring.stop_animation()
+        window.close()
+
+
+class StartupProfiler:
+    """--profile-startup：记录启动各阶段的时间点，结束时打印耗时分解
+
+    tolist.py 里有一份相同的副本：两个应用都是独立的单文件脚本，改动时两边一起改。
+    """
+
+    def __init__(self):
+        self.start = _IMPORT_START
+        self.marks = [("import PySide6", _IMPORT_END), ("module body", time.perf_counter())]
+        self._seen = set()
+
+    def mark(self, name):
+        if name not in self._seen:  # 同一阶段只记第一次
+            self._seen.add(name)
+            self.marks.append((name, time.perf_counter()))
+
+    def report(self, file=sys.stderr):
+        print(f"{'stage':<24}{'delta':>10}{'total':>10}", file=file)
+        prev = self.start
+        for name, t in self.marks:
+            print(f"{name:<24}{(t - prev) * 1000:>8.1f}ms{(t - self.start) * 1000:>8.1f}ms", file=file)
+            prev = t
+
+
+def report_deferred_import(file=sys.stderr):
+    """单独测一次推迟到首次请求时的 SDK 导入，它不在启动路径上"""
+    t = time.perf_counter()
+    try:
+        import google.generativeai
+    except ImportError:
+        print("deferred: google.generativeai not installed", file=file)
+        return
+    print(f"deferred: import google.generativeai {(time.perf_counter() - t) * 1000:.1f}ms", file=file)
+
+
+def profile_startup(profiler, window):
+    """第一轮事件循环（首帧）时打印并退出"""
+    def done():
+        profiler.mark("first event loop pass")
+        profiler.report()
+        report_deferred_import()
+        window.close()
+        QApplication.quit()
+    QTimer.singleShot(0, done)
 
 
 if __name__ == "__main__":
+    if "--bench-ring" in sys.argv:
+        args = sys.argv[sys.argv.index("--bench-ring") + 1:]
+        bench_ring_cpu(float(args[0]) if args else 5.0)
+        sys.exit(0)
+    if "--bench-ai" in sys.argv:
+        bench_providers(sys.argv[sys.argv.index("--bench-ai") + 1:])
+        sys.exit(0)
+
+    profiler = StartupProfiler() if "--profile-startup" in sys.argv else None
+
     app = QApplication(sys.argv)
-    font_id = QFontDatabase.addApplicationFont("")
     app.setFont(QFont("Segoe UI", 9))
+    if profiler:
+        profiler.mark("QApplication")
 
     window = FocusFlowWindow()
+    app.aboutToQuit.connect(AIService.shutdown)
+    if profiler:
+        profiler.mark("FocusFlowWindow()")
+        profile_startup(profiler, window)
     window.show()
+    if profiler:
+        profiler.mark("show()")
     sys.exit(app.exec())
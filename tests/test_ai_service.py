@@ -0,0 +1,174 @@
+"""AIService 的行为测试：用本地的假提供方代替网络，覆盖合并、取消、截止回退和缓存"""
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from PySide6.QtCore import QCoreApplication
+
+import bubble
+from bubble import AIProvider, AIService, ResponseCache, TemplateProvider
+
+
+class StubProvider(AIProvider):
+    """固定回复；delay 模拟网络延迟（超过 timeout 时抛出 TimeoutError），收到的 prompt 记在 prompts 里"""
+    name = "stub"
+
+    def __init__(self, reply="Stretch, sip some water, look out the window.", delay=0.0):
+        self.reply = reply
+        self.delay = delay
+        self.prompts = []
+
+    def complete(self, prompt, timeout=None):
+        self.prompts.append(prompt)
+        if timeout is not None and self.delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(prompt)
+        if self.delay:
+            time.sleep(self.delay)
+        return self.reply
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+@pytest.fixture
+def make_service(app, tmp_path):
+    services = []
+
+    def make(provider, cache=True):
+        service = AIService(provider, ResponseCache(str(tmp_path / "cache.json")) if cache else None)
+        results = []
+        service.finished.connect(lambda request_id, text: results.append((request_id, text)))
+        service.start()
+        services.append(service)
+        return service, results
+
+    yield make
+    for service in services:
+        service.stop()
+
+
+def wait_until(app, predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        app.processEvents()
+        time.sleep(0.005)
+    return True
+
+
+def test_request_delivers_provider_reply(app, make_service):
+    provider = StubProvider(reply="Walk around the room.")
+    service, results = make_service(provider)
+    request_id = service.request("break", "Write report")
+    assert wait_until(app, lambda: results)
+    assert results == [(request_id, "Walk around the room.")]
+    assert provider.prompts == [bubble.build_prompt("break", "Write report")]
+
+
+def test_identical_requests_are_merged(app, make_service):
+    provider = StubProvider(delay=0.2)
+    service, results = make_service(provider)
+    first = service.request("break", "Write report")
+    second = service.request("break", "  write REPORT ")
+    assert first == second
+    assert wait_until(app, lambda: results)
+    app.processEvents()
+    assert results == [(first, provider.reply)]
+    assert len(provider.prompts) == 1
+
+
+def test_cancelled_request_is_not_sent(app, make_service):
+    provider = StubProvider(delay=0.2)
+    service, results = make_service(provider)
+    busy = service.request("tip")
+    queued = service.request("break", "Write report")
+    service.cancel(queued)
+    assert wait_until(app, lambda: results)
+    time.sleep(0.1)
+    app.processEvents()
+    assert results == [(busy, provider.reply)]
+    assert len(provider.prompts) == 1
+
+
+def test_deadline_falls_back_and_caches_late_reply(app, make_service):
+    provider = StubProvider(reply="Late but useful.", delay=0.3)
+    service, results = make_service(provider)
+    request_id = service.request("break", "Write report", deadline_ms=100)
+    assert wait_until(app, lambda: results, timeout=0.5)
+    assert results[0][0] == request_id
+    assert results[0][1] in TemplateProvider.BREAKS
+    # 迟到的回复不再送回，但留给下一次
+    assert wait_until(app, lambda: service.cache.size("break", "Write report") == 1)
+    assert len(results) == 1
+    assert service.cached("break", "Write report") == "Late but useful."
+    assert service.cached("break", "Write report") is None
+
+
+def test_prefetch_fills_cache_without_emitting(app, make_service):
+    provider = StubProvider()
+    service, results = make_service(provider)
+    service.prefetch("break", "Write report", count=2)
+    service.prefetch("break", "Write report", count=2)  # 已排队的预取也算在内
+    assert wait_until(app, lambda: service.cache.size("break", "Write report") == 2)
+    assert len(provider.prompts) == 2
+    assert results == []
+
+
+def test_request_does_not_wait_behind_a_slow_prefetch(app, make_service):
+    class SlowBreaks(StubProvider):
+        def complete(self, prompt, timeout=None):
+            if prompt == bubble.build_prompt("break", "Write report"):
+                time.sleep(min(timeout, 1.0))
+            return super().complete(prompt, timeout)
+
+    provider = SlowBreaks(reply="Fresh tip.")
+    service, results = make_service(provider)
+    service.prefetch("break", "Write report")
+    time.sleep(0.05)  # 预取已经发出
+    request_id = service.request("tip", deadline_ms=500)
+    assert wait_until(app, lambda: results, timeout=0.4)
+    assert results == [(request_id, "Fresh tip.")]
+
+
+def test_without_provider_reports_missing_key(app, make_service):
+    service, results = make_service(None)
+    request_id = service.request("tip")
+    assert wait_until(app, lambda: results)
+    assert results == [(request_id, AIService.NO_KEY_TEXT)]
+    assert service.cached("tip") is None
+
+
+@pytest.mark.parametrize("content", ['[["tip", "", 5]]', '{"tip": []}', '[[["tip"], "", []]]',
+                                     '[["tip", "", [["soon", "x"]]]]', 'not json'])
+def test_malformed_cache_file_is_ignored(app, tmp_path, make_service, content):
+    (tmp_path / "cache.json").write_text(content, encoding="utf-8")
+    provider = StubProvider()
+    service, results = make_service(provider)
+    request_id = service.request("tip")
+    assert wait_until(app, lambda: results)
+    assert results == [(request_id, provider.reply)]
+    service.prefetch("break", "Write report")
+    assert wait_until(app, lambda: service.cache.size("break", "Write report") == 1)
+
+
+def test_stop_does_not_wait_for_a_stuck_provider(app, monkeypatch, make_service):
+    monkeypatch.setattr(AIService, "STOP_TIMEOUT_MS", 100)
+    service, _ = make_service(StubProvider(delay=5.0), cache=False)
+    service.request("tip", deadline_ms=10_000)
+    time.sleep(0.05)
+    started = time.monotonic()
+    assert service.stop() is False
+    assert time.monotonic() - started < 1.0
+
+
+def test_stub_is_not_user_selectable():
+    assert "stub" not in bubble.PROVIDERS
+    assert bubble.create_provider("stub") is None
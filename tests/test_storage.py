@@ -0,0 +1,106 @@
+"""DataManager / JsonTaskStream 的崩溃安全测试：快照代号、写了一半的日志行、流式读取时折叠日志；
+以及 ArchiveReader 对墓碑的处理"""
+import json
+import os
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from tolist import ArchiveReader, ArchiveStore, DataManager, JsonTaskStream
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(DataManager, "BACKEND", "json")
+    return tmp_path
+
+
+def task(task_id, text, order=0):
+    return {"id": task_id, "text": text, "completed": False, "priority": "none", "order": order}
+
+
+def loaded():
+    return [(t.id, t.text) for t in DataManager.load_json_todos()]
+
+
+def streamed(chunk_size=2):
+    return [(t.id, t.text) for chunk in JsonTaskStream(chunk_size) for t in chunk]
+
+
+def test_journal_survives_snapshot_metadata_change():
+    DataManager.save_todos([task("a", "x")])
+    DataManager.append_records([{"op": "update", "id": "a", "fields": {"text": "x2"}},
+                                {"op": "add", "task": task("b", "y", 1)}])
+    os.utime(DataManager.FILE_NAME, (0, 0))  # 复制 / 同步 / touch 都只改元数据
+    assert loaded() == [("a", "x2"), ("b", "y")]
+    assert streamed() == [("a", "x2"), ("b", "y")]
+    assert os.path.exists(DataManager.JOURNAL_NAME)
+
+
+def test_compaction_starts_a_new_generation():
+    DataManager.save_todos([task("a", "x")])
+    first = DataManager.snapshot_generation()
+    DataManager.append_records([{"op": "update", "id": "a", "fields": {"text": "x2"}}])
+    DataManager.save_todos([task("a", "x2")])
+    assert DataManager.snapshot_generation() not in (None, first)
+    assert not os.path.exists(DataManager.JOURNAL_NAME)
+
+
+def test_journal_of_a_replaced_snapshot_is_not_replayed():
+    DataManager.save_todos([task("a", "x")])
+    # 压缩时在替换快照之后、删除日志之前崩溃：日志属于上一代快照
+    with open(DataManager.JOURNAL_NAME, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"generation": "0" * 32}) + "\n")
+        f.write(json.dumps({"op": "delete", "id": "a"}) + "\n")
+    assert loaded() == [("a", "x")]
+    assert not os.path.exists(DataManager.JOURNAL_NAME)
+
+
+def test_torn_last_line_is_ignored():
+    DataManager.save_todos([task("a", "x")])
+    DataManager.append_records([{"op": "update", "id": "a", "fields": {"text": "x2"}}])
+    with open(DataManager.JOURNAL_NAME, "a", encoding="utf-8") as f:
+        f.write('{"op": "delete", "id": "a"')  # 写到一半时断电
+    assert loaded() == [("a", "x2")]
+    assert streamed() == [("a", "x2")]
+
+
+def test_stream_folds_journal_like_full_load():
+    DataManager.save_todos([task(str(i), f"t{i}", i) for i in range(5)])
+    DataManager.append_records([
+        {"op": "update", "id": "1", "fields": {"text": "one"}},
+        {"op": "delete", "id": "2"},
+        {"op": "add", "task": task("n", "new", 9)},
+        {"op": "batch", "records": [{"op": "update", "id": "n", "fields": {"text": "newer"}},
+                                    {"op": "update", "id": "4", "fields": {"text": "four"}}]},
+        {"op": "add", "task": task("gone", "tmp", 10)},
+        {"op": "delete", "id": "gone"},
+    ])
+    expected = [("0", "t0"), ("1", "one"), ("3", "t3"), ("4", "four"), ("n", "newer")]
+    assert loaded() == expected
+    assert streamed() == expected
+
+
+def test_bare_list_snapshot_keeps_its_journal():
+    with open(DataManager.FILE_NAME, "w", encoding="utf-8") as f:
+        json.dump([task("a", "x")], f)
+    assert DataManager.snapshot_generation() is None
+    DataManager.append_records([{"op": "update", "id": "a", "fields": {"text": "x2"}}])
+    os.utime(DataManager.FILE_NAME, (0, 0))
+    assert streamed() == [("a", "x2")]
+
+
+def test_archive_tombstone_hides_earlier_copies():
+    ArchiveStore.append([task("a", "x"), task("b", "y"), task("c", "z")])
+    ArchiveStore.append([{"id": "a", "deleted": True}, {"id": "b", "deleted": True}])
+    ArchiveStore.append([task("b", "y2")])  # 恢复后再次归档
+    reader = ArchiveReader()
+    pages = []
+    reader.page_loaded.connect(pages.append)
+    reader.request_more()
+    reader.run()
+    assert [(t.id, t.text) for page in pages for t in page] == [("c", "z"), ("b", "y2")]
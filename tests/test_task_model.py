@@ -0,0 +1,76 @@
+"""TaskListModel.update_tasks 的随机测试：结果顺序正确，发出的增删移动通知由 QAbstractItemModelTester 校验"""
+import os
+import random
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from PySide6.QtCore import QCoreApplication
+from PySide6.QtTest import QAbstractItemModelTester
+
+from tolist import Task, TaskListModel
+
+
+def make_task(n):
+    return Task(id=str(n), text=f"task {n}", order=n)
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def checked_model(tasks):
+    model = TaskListModel()
+    model.tester = QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+    model.set_tasks(tasks)
+    moves = []
+    model.rowsMoved.connect(lambda *args: moves.append(args))
+    return model, moves
+
+
+def edit(rng, pool, old):
+    """保留大部分行，打乱几行，增删几行"""
+    new = [t for t in old if rng.random() < 0.9]
+    for _ in range(rng.randint(0, 4)):
+        if new:
+            t = new.pop(rng.randrange(len(new)))
+            new.insert(rng.randrange(len(new) + 1), t)
+    for t in pool:
+        if t not in old and rng.random() < 0.05:
+            new.insert(rng.randrange(len(new) + 1), t)
+    return new
+
+
+def test_random_edits_produce_the_new_order(app):
+    rng = random.Random(20261017)
+    pool = [make_task(i) for i in range(60)]
+    for _ in range(500):
+        old = rng.sample(pool, rng.randint(0, 30))
+        new = edit(rng, pool, old)
+        model, _ = checked_model(old)
+        model.update_tasks(new)
+        assert model.tasks() == new
+
+
+def test_single_drag_is_one_move(app):
+    tasks = [make_task(i) for i in range(50)]
+    for src, dst in [(0, 49), (49, 0), (10, 30), (30, 10)]:
+        new = tasks[:]
+        new.insert(dst, new.pop(src))
+        model, moves = checked_model(tasks)
+        model.update_tasks(new)
+        assert model.tasks() == new
+        assert len(moves) == 1
+
+
+def test_mostly_new_rows_reset_the_model(app):
+    tasks = [make_task(i) for i in range(100)]
+    model, moves = checked_model(tasks[::10])
+    resets = []
+    model.modelReset.connect(lambda: resets.append(1))
+    model.update_tasks(tasks)
+    assert model.tasks() == tasks
+    assert resets and not moves
@@ -1,13 +1,27 @@
+import bisect
+import gzip
 import json
 import os
+import re
+import sqlite3
 import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import date
 
-from PySide6.QtCore import Qt, QSize, QPoint
-from PySide6.QtGui import QColor, QFont
+_IMPORT_START = time.perf_counter()  # --profile-startup：从这里开始计 Qt 的导入耗时
+
+from PySide6.QtCore import (Qt, QSize, QPoint, QRect, QThread, QTimer, Signal, QEvent,
+                            QAbstractListModel, QModelIndex, QMimeData)
+from PySide6.QtGui import QColor, QFont, QFontMetrics, QPainter, QPen, QPainterPath
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
-                               QHBoxLayout, QLabel, QPushButton, QListWidget,
-                               QListWidgetItem, QLineEdit, QCheckBox, QGraphicsDropShadowEffect,
-                               QComboBox, QMenu)
+                               QHBoxLayout, QLabel, QPushButton, QListView,
+                               QLineEdit, QGraphicsDropShadowEffect, QComboBox, QMenu,
+                               QStyledItemDelegate, QStyle, QAbstractItemView)
+
+_IMPORT_END = time.perf_counter()
 
 # ==========================================
 # 🎨 样式表 (QSS) - Mac 风格 & Glassmorphism 模拟
@@ -96,37 +110,12 @@ QComboBox QAbstractItemView {
     outline: none;
     padding: 3px;
 }
-/* 优先级旗帜按钮 */
-QPushButton#FlagButton {
-    border: none;
-    border-radius: 3px;
-    padding: 2px;
-    font-size: 14px;
-    background-color: transparent;
-}
-QPushButton#FlagButton:hover {
-    background-color: rgba(0, 0, 0, 0.05);
-}
-/* 任务列表 */
-QListWidget {
+/* 任务列表（行由 TaskItemDelegate 绘制） */
+QListView {
     background-color: transparent;
     border: none;
     outline: none;
 }
-QListWidget::item {
-    background-color: rgba(255, 255, 255, 150);
-    border-radius: 6px;
-    margin-bottom: 4px;
-    border: 1px solid rgba(255, 255, 255, 100);
-    padding: 2px;
-}
-QListWidget::item:hover {
-    background-color: rgba(255, 255, 255, 220);
-}
-QListWidget::item:selected {
-    background-color: rgba(255, 255, 255, 255);
-    border: 1px solid rgba(0, 0, 0, 10);
-}
 /* 滚动条 */
 QScrollBar:vertical {
     border: none;
@@ -165,151 +154,1337 @@ PRIORITY_CONFIG = {
 }
 
 
+TASK_FIELDS = ("id", "text", "completed", "category", "priority", "order", "due", "completed_at")
+_PRIORITY_KEYS = {key: key for key in PRIORITY_CONFIG}  # 读入的优先级统一指向这几个字符串
+
+
+@dataclass(slots=True, eq=False)
+class Task:
+    """一条任务
+
+    使用 __slots__ 而不是 dict，每个任务省去一张哈希表；priority / category
+    指向共享的驻留字符串，不再每个任务各存一份。eq=False：按对象身份比较，
+    内容相同的两条任务仍是两条。不认识的字段保存在 extra 中，写回时原样输出。
+    """
+    id: str
+    text: str
+    completed: bool = False
+    category: str = "all"
+    priority: str = "none"
+    order: float = 0
+    due: str = None  # 截止日期 "YYYY-MM-DD"
+    completed_at: float = None  # 完成时间 (time.time())，用于自动归档
+    extra: dict = None
+    archive_seq: int = 0  # 从归档读出的任务按读取顺序编号；0 表示在活跃数据中，不持久化
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {k: v for k, v in data.items() if k not in TASK_FIELDS}
+        return cls(data["id"], data["text"], bool(data.get("completed", False)),
+                   sys.intern(data.get("category", "all")),
+                   _PRIORITY_KEYS.get(data.get("priority"), "none"),
+                   data.get("order", 0), data.get("due"), data.get("completed_at"), extra or None)
+
+    def to_dict(self):
+        data = {"id": self.id, "text": self.text, "completed": self.completed,
+                "category": self.category, "priority": self.priority, "order": self.order}
+        if self.due:
+            data["due"] = self.due
+        if self.completed_at:
+            data["completed_at"] = self.completed_at
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def update(self, fields):
+        for key, value in fields.items():
+            if key in TASK_FIELDS:
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+
+_GENERATION_RE = re.compile(r'\s*\{\s*"generation"\s*:\s*"([0-9a-f]+)"')
+
+
 class DataManager:
-    """简单的 JSON 数据管理"""
+    """JSON 快照 + 追加日志 (journal) 的数据管理
+
+    每次修改只向 todos.journal 追加一行记录，写入代价与任务数量无关；
+    日志累积到 COMPACT_THRESHOLD 条后再整体压缩成 todos.json 快照。
+    快照写成 {"generation": 代号, "tasks": [...]}，每次压缩换一个新代号；日志首行
+    记录它所基于的代号，快照替换后旧日志自动失效，因此压缩过程中任何时刻崩溃
+    都不会重复回放或丢失记录。代号写在文件内容里，复制、同步、touch 快照都不影响。
+    旧版快照是纯数组，没有代号（记为 None）。
+    """
     FILE_NAME = "todos.json"
+    JOURNAL_NAME = "todos.journal"
+    COMPACT_THRESHOLD = 500
+    BACKEND = os.getenv("TODO_BACKEND", "json")  # "json" 或 "sqlite"
+
+    _journal_size = 0
 
     @staticmethod
-    def load_todos():
-        if not os.path.exists(DataManager.FILE_NAME):
-            return []
+    def snapshot_generation():
+        """当前快照的代号，用于判断日志是否属于它；代号写在文件开头，只读头部"""
         try:
             with open(DataManager.FILE_NAME, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                for i, task in enumerate(data):
-                    if "priority" not in task:
-                        task["priority"] = "none"
-                    if "order" not in task:
-                        task["order"] = i
-                return data
-        except:
+                head = f.read(256)
+        except OSError:
+            return None
+        match = _GENERATION_RE.match(head)
+        return match.group(1) if match else None
+
+    @staticmethod
+    def load_json_todos():
+        """读取 JSON 快照并回放日志"""
+        data = []
+        if os.path.exists(DataManager.FILE_NAME):
+            try:
+                with open(DataManager.FILE_NAME, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = []
+        if isinstance(data, dict):
+            data = data.get("tasks", [])
+        for i, task in enumerate(data):
+            if "priority" not in task:
+                task["priority"] = "none"
+            if "order" not in task:
+                task["order"] = i
+        DataManager._replay_journal(data)
+
+        # 旧文件没有 id：补上后立即写一次快照，之后的日志记录都按 id 引用任务
+        migrated = False
+        for task in data:
+            if "id" not in task:
+                task["id"] = DataManager.new_id()
+                migrated = True
+        if migrated:
+            DataManager._save_json(data)
+        return [Task.from_dict(task) for task in data]
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def read_journal():
+        """读取属于当前快照的日志记录；日志已过期时删除它并返回空列表"""
+        DataManager._journal_size = 0
+        if not os.path.exists(DataManager.JOURNAL_NAME):
             return []
+        try:
+            with open(DataManager.JOURNAL_NAME, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return []
+
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except ValueError:
+            header = {}
+        if header.get("generation") != DataManager.snapshot_generation():
+            # 日志属于已被替换的旧快照（压缩时崩溃），内容已包含在新快照里
+            os.remove(DataManager.JOURNAL_NAME)
+            return []
+
+        records = []
+        for line in lines[1:]:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break  # 最后一行写到一半时崩溃，之后的内容不可信
+        DataManager._journal_size = len(records)
+        return records
+
+    @staticmethod
+    def iter_records(records):
+        """展开批量记录 {"op": "batch", "records": [...]}，逐条产出"""
+        for record in records:
+            if record.get("op") == "batch":
+                yield from DataManager.iter_records(record["records"])
+            else:
+                yield record
+
+    @staticmethod
+    def _replay_journal(todos):
+        """把日志中的修改按顺序回放到快照数据上"""
+        by_id = {task["id"]: task for task in todos if "id" in task}
+        deleted = set()
+        for record in DataManager.iter_records(DataManager.read_journal()):
+            DataManager.apply_record(todos, by_id, deleted, record)
+        if deleted:
+            todos[:] = [task for task in todos if task.get("id") not in deleted]
+
+    @staticmethod
+    def apply_record(todos, by_id, deleted, record):
+        """回放一条按 id 引用任务的记录；删除只做标记，由调用方统一过滤"""
+        op = record.get("op")
+        if op == "add":
+            task = record["task"]
+            todos.append(task)
+            by_id[task["id"]] = task
+            return
+        task = by_id.get(record.get("id"))
+        if task is None:
+            return
+        if op == "update":
+            task.update(record["fields"])
+        elif op == "delete":
+            del by_id[task["id"]]
+            deleted.add(task["id"])
+
+    @staticmethod
+    def append_records(records):
+        """一次性追加多条修改记录，返回是否需要压缩成快照"""
+        if DataManager.BACKEND == "sqlite":
+            SQLiteStore.shared().apply_records(records)
+            return False
+        is_new = not os.path.exists(DataManager.JOURNAL_NAME)
+        lines = [json.dumps(record, ensure_ascii=False) + "\n" for record in records]
+        if is_new:
+            lines.insert(0, json.dumps({"generation": DataManager.snapshot_generation()}) + "\n")
+        with open(DataManager.JOURNAL_NAME, 'a', encoding='utf-8') as f:
+            start = f.tell()
+            try:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError:
+                # 写了一半的行会让之后追加的记录都无法回放：截回写入前的长度再报错
+                f.truncate(start)
+                raise
+        DataManager._journal_size += len(records)
+        return DataManager._journal_size >= DataManager.COMPACT_THRESHOLD
 
     @staticmethod
     def save_todos(todos):
-        with open(DataManager.FILE_NAME, 'w', encoding='utf-8') as f:
-            json.dump(todos, f, ensure_ascii=False, indent=2)
+        """写入完整快照并清空日志（压缩）"""
+        if DataManager.BACKEND == "sqlite":
+            SQLiteStore.shared().replace_all(todos)
+            return
+        DataManager._save_json(todos)
 
+    @staticmethod
+    def _save_json(todos):
+        tmp_name = DataManager.FILE_NAME + ".tmp"
+        with open(tmp_name, 'w', encoding='utf-8') as f:
+            # generation 必须在 tasks 之前，snapshot_generation 只读文件头部
+            json.dump({"generation": DataManager.new_id(), "tasks": todos}, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, DataManager.FILE_NAME)
+        if os.path.exists(DataManager.JOURNAL_NAME):
+            os.remove(DataManager.JOURNAL_NAME)
+        DataManager._journal_size = 0
+
+
+class ArchiveStore:
+    """已完成任务的归档层 (todos.archive.jsonl.gz)
+
+    完成超过 ARCHIVE_AFTER_DAYS 天的任务移出活跃数据，每行一个 JSON 追加到归档。
+    每次追加写成一个独立的 gzip member，gzip 读取时会把多个 member 连起来，
+    所以追加不需要重写已有内容。归档先于删除写入：中途崩溃最多留下重复的行，
+    读取时按 id 去重即可，不会丢任务。任务离开归档（恢复或删除）时追加一行
+    墓碑 {"id": ..., "deleted": true}，之前的行读取时一并跳过。
+    """
+    FILE_NAME = "todos.archive.jsonl.gz"
+    ARCHIVE_AFTER_DAYS = int(os.getenv("TODO_ARCHIVE_DAYS", "30"))  # 0 表示不自动归档
 
-class TaskItemWidget(QWidget):
-    """自定义的任务列表项 UI"""
+    @staticmethod
+    def exists():
+        try:
+            return os.path.getsize(ArchiveStore.FILE_NAME) > 0
+        except OSError:
+            return False
 
-    def __init__(self, text, is_completed, priority, on_toggle, on_delete, on_priority_change):
-        super().__init__()
-        self.priority = priority
-        self.on_priority_change = on_priority_change
+    @staticmethod
+    def append(todos):
+        """把一批任务 (dict) 追加为一个新的 gzip member"""
+        lines = "".join(json.dumps(task, ensure_ascii=False) + "\n" for task in todos)
+        with open(ArchiveStore.FILE_NAME, 'ab') as f:
+            start = f.tell()
+            try:
+                with gzip.GzipFile(fileobj=f, mode='wb') as gz:
+                    gz.write(lines.encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError:
+                f.truncate(start)  # 残缺的 member 会挡住之后追加的所有内容
+                raise
 
-        layout = QHBoxLayout(self)
-        layout.setContentsMargins(8, 5, 8, 5)
-        layout.setSpacing(8)
+    @staticmethod
+    def iter_tasks():
+        """按归档顺序逐条产出任务 (dict)；末尾写了一半的 member 直接忽略"""
+        try:
+            with gzip.open(ArchiveStore.FILE_NAME, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        return
+        except (OSError, EOFError):
+            return
+
+
+class JsonTaskStream:
+    """增量解析 todos.json，按块产出任务
+
+    每次只读入 READ_SIZE 字节，用 raw_decode 逐个解析顶层数组的元素，
+    不需要同时持有整个文件文本和完整的对象图。日志先被读入并按 id 折叠，
+    流过每个任务时顺便应用；日志里新增的任务在最后产出。
+    迭代结束后 migrated 表示是否给旧任务补了 id（调用方应再写一次快照）。
+    """
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, chunk_size=200, path=None):
+        self.chunk_size = chunk_size
+        self.path = path or DataManager.FILE_NAME
+        self.migrated = False
+
+    def __iter__(self):
+        records = DataManager.read_journal()
+        updates, deleted, added = self._fold(records)
+        chunk = []
+        for i, task in enumerate(self._iter_array()):
+            task_id = task.get("id")
+            if task_id in deleted:
+                continue
+            if "priority" not in task:
+                task["priority"] = "none"
+            if "order" not in task:
+                task["order"] = i
+            if task_id is None:
+                task["id"] = DataManager.new_id()
+                self.migrated = True
+            elif task_id in updates:
+                task.update(updates[task_id])
+            chunk.append(Task.from_dict(task))
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        chunk.extend(Task.from_dict(task) for task in added.values())
+        if chunk:
+            yield chunk
 
-        # 拖拽手柄
-        self.drag_handle = QLabel("⋮⋮")
-        self.drag_handle.setStyleSheet("color: #ddd; font-size: 13px; font-weight: bold;")
-        self.drag_handle.setFixedWidth(16)
-        self.drag_handle.setCursor(Qt.OpenHandCursor)
-
-        # Checkbox
-        self.checkbox = QCheckBox()
-        self.checkbox.setChecked(is_completed)
-        self.checkbox.stateChanged.connect(on_toggle)
-        self.checkbox.setStyleSheet("""
-            QCheckBox::indicator { 
-                width: 16px; 
-                height: 16px; 
-                border-radius: 4px; 
-                border: 1px solid #ccc; 
-                background: white; 
-            }
-            QCheckBox::indicator:checked { 
-                background-color: #007AFF; 
-                border-color: #007AFF; 
-            }
-        """)
-
-        # Label
-        self.label = QLabel(text)
-        font = QFont("Segoe UI", 9)
-        self.label.setFont(font)
-        self.update_style(is_completed)
-
-        # 优先级旗帜按钮（放在右侧）
-        self.flag_btn = QPushButton(PRIORITY_CONFIG[priority]["flag"])
-        self.flag_btn.setObjectName("FlagButton")
-        self.flag_btn.setFixedSize(24, 24)
-        self.flag_btn.setCursor(Qt.PointingHandCursor)
-        self.flag_btn.setToolTip(PRIORITY_CONFIG[priority]["label"])
-        self.flag_btn.clicked.connect(self.show_priority_menu)
-
-        # Delete Button
-        self.del_btn = QPushButton("✕")
-        self.del_btn.setFixedSize(20, 20)
-        self.del_btn.setCursor(Qt.PointingHandCursor)
-        self.del_btn.setStyleSheet("""
-            QPushButton { 
-                border-radius: 3px; 
-                color: #bbb; 
-                background: transparent; 
-                font-weight: bold;
-                font-size: 14px;
-            }
-            QPushButton:hover { 
-                color: #ff3b30; 
-                background: rgba(255, 59, 48, 0.1); 
-            }
-        """)
-        self.del_btn.clicked.connect(on_delete)
-
-        layout.addWidget(self.drag_handle)
-        layout.addWidget(self.checkbox)
-        layout.addWidget(self.label, 1)  # 让文字占据剩余空间
-        layout.addWidget(self.flag_btn)
-        layout.addWidget(self.del_btn)
-
-    def show_priority_menu(self):
-        """显示优先级选择菜单"""
-        menu = QMenu(self)
+    @staticmethod
+    def _fold(records):
+        """把日志折叠成 每个 id 的最终字段 / 已删除 id / 新增任务"""
+        updates, deleted, added = {}, set(), {}
+        for record in DataManager.iter_records(records):
+            op = record.get("op")
+            if op == "add":
+                added[record["task"]["id"]] = record["task"]
+            elif op == "update":
+                if record["id"] in added:
+                    added[record["id"]].update(record["fields"])
+                else:
+                    updates.setdefault(record["id"], {}).update(record["fields"])
+            elif op == "delete":
+                if added.pop(record["id"], None) is None:
+                    deleted.add(record["id"])
+                    updates.pop(record["id"], None)
+        return updates, deleted, added
+
+    def _iter_array(self):
+        """逐个产出任务数组中的元素（旧版顶层数组，或快照对象里的 "tasks"）；文件损坏时就此停止"""
+        if not os.path.exists(self.path):
+            return
+        decoder = json.JSONDecoder()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                buf, pos, eof = "", 0, False
+                state = "start"  # start -> [key -> value ... -> tasks] -> array
+                while True:
+                    # 跳过空白和分隔符
+                    while pos < len(buf) and buf[pos] in " \t\r\n,:":
+                        pos += 1
+                    if pos < len(buf) and state in ("start", "tasks"):
+                        if buf[pos] == "[":
+                            state, pos = "array", pos + 1
+                        elif buf[pos] == "{" and state == "start":
+                            state, pos = "key", pos + 1
+                        else:
+                            return
+                        continue
+                    if pos < len(buf) and buf[pos] in "]}":
+                        return
+                    if pos < len(buf):
+                        try:
+                            item, end = decoder.raw_decode(buf, pos)
+                        except ValueError:
+                            if eof:
+                                return
+                        else:
+                            pos = end
+                            if state == "array":
+                                yield item
+                            elif state == "key":
+                                state = "tasks" if item == "tasks" else "value"
+                            else:
+                                state = "key"
+                            continue
+                    elif eof:
+                        return
+                    # 缓冲区里不是完整的元素：丢掉已解析部分，再读一块
+                    more = f.read(self.READ_SIZE)
+                    eof = not more
+                    buf, pos = buf[pos:] + more, 0
+        except OSError:
+            return
+
+
+class SQLiteStore:
+    """可选的 SQLite 存储后端（TODO_BACKEND=sqlite）
+
+    表上建有 (completed, order) 和 (completed, priority, order) 索引，
+    各视图可以按页查询；使用 WAL 模式，后台写入不会阻塞读取。
+    不在固定列里的字段存进 extra (JSON)。每个线程各用一个连接。
+    """
+    DB_NAME = os.getenv("TODO_DB", "todos.db")
+    COLUMNS = ("id", "text", "completed", "category", "priority", "order")
+
+    _shared = None
+
+    def __init__(self, path=None):
+        self.path = path or self.DB_NAME
+        self._local = threading.local()
+        conn = self.connection()
+        with conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    completed INTEGER NOT NULL DEFAULT 0,
+                    category TEXT NOT NULL DEFAULT 'all',
+                    priority TEXT NOT NULL DEFAULT 'none',
+                    ord REAL NOT NULL DEFAULT 0,
+                    extra TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_tasks_view ON tasks (completed, ord, id);
+                CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks (completed, priority, ord, id);
+            """)
+
+    @classmethod
+    def shared(cls):
+        if cls._shared is None:
+            cls._shared = cls()
+            cls._shared.import_json_once()
+        return cls._shared
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- 行与任务的转换（写入的是日志 / 快照里的 dict，读出的是 Task）---
+    @staticmethod
+    def _to_row(task):
+        extra = {k: v for k, v in task.items() if k not in SQLiteStore.COLUMNS}
+        return (task["id"], task["text"], int(bool(task["completed"])), task.get("category", "all"),
+                task.get("priority", "none"), task.get("order", 0),
+                json.dumps(extra, ensure_ascii=False) if extra else None)
 
-        for key in ["high", "medium", "low", "none"]:
-            action = menu.addAction(PRIORITY_CONFIG[key]["label"])
-            action.triggered.connect(lambda checked=False, k=key: self.change_priority(k))
+    @staticmethod
+    def _to_task(row):
+        task_id, text, completed, category, priority, order, extra = row
+        data = json.loads(extra) if extra else {}
+        data.update(id=task_id, text=text, completed=bool(completed), category=category,
+                    priority=priority, order=order)
+        return Task.from_dict(data)
+
+    # --- DataManager 接口 ---
+    def apply_records(self, records):
+        """在一个事务里应用一批日志记录"""
+        conn = self.connection()
+        with conn:
+            for record in DataManager.iter_records(records):
+                op = record.get("op")
+                if op == "add":
+                    conn.execute("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 self._to_row(record["task"]))
+                elif op == "delete":
+                    conn.execute("DELETE FROM tasks WHERE id = ?", (record["id"],))
+                elif op == "update":
+                    self._update(conn, record["id"], record["fields"])
+
+    def _update(self, conn, task_id, fields):
+        columns = {"ord" if k == "order" else k: (int(v) if k == "completed" else v)
+                   for k, v in fields.items() if k in self.COLUMNS and k != "id"}
+        if columns:
+            assignments = ", ".join(f"{name} = ?" for name in columns)
+            conn.execute(f"UPDATE tasks SET {assignments} WHERE id = ?", (*columns.values(), task_id))
+        extra_fields = {k: v for k, v in fields.items() if k not in self.COLUMNS}
+        if extra_fields:
+            row = conn.execute("SELECT extra FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is not None:
+                extra = json.loads(row[0]) if row[0] else {}
+                extra.update(extra_fields)
+                conn.execute("UPDATE tasks SET extra = ? WHERE id = ?",
+                             (json.dumps(extra, ensure_ascii=False), task_id))
+
+    def replace_all(self, todos):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM tasks")
+            conn.executemany("INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (self._to_row(task) for task in todos))
+
+    # --- 分页查询 ---
+    @staticmethod
+    def _view_filter(view):
+        return "completed = 1" if view == "completed" else "completed = 0"
+
+    def query_view(self, view, limit, offset=0, after=None):
+        """按视图分页读取，走 (completed, ord, id) 索引
+
+        after=(order, id) 时按键集分页，从该任务之后开始读；
+        即使后台同时有写入，也不会像 OFFSET 那样漏读或重读。
+        """
+        where, params = self._view_filter(view), []
+        if after is not None:
+            where += " AND (ord, id) > (?, ?)"
+            params.extend(after)
+        rows = self.connection().execute(
+            "SELECT id, text, completed, category, priority, ord, extra FROM tasks "
+            f"WHERE {where} ORDER BY ord, id LIMIT ? OFFSET ?", (*params, limit, offset))
+        return [self._to_task(row) for row in rows]
+
+    # --- 从 JSON 导入 ---
+    def import_json_once(self):
+        """数据库为空且存在 todos.json 时，一次性导入原有数据"""
+        if self.connection().execute("SELECT 1 FROM tasks LIMIT 1").fetchone():
+            return 0
+        if not (os.path.exists(DataManager.FILE_NAME) or os.path.exists(DataManager.JOURNAL_NAME)):
+            return 0
+        todos = DataManager.load_json_todos()
+        self.replace_all([task.to_dict() for task in todos])
+        return len(todos)
+
+
+class PersistenceWriter(QThread):
+    """后台持久化线程
+
+    UI 线程只负责提交修改记录或快照；本线程在 debounce 窗口内合并连续的修改
+    （快速点选、拖拽排序等），一次性写盘。stop() 会在退出前把剩余内容刷到磁盘。
+    写盘出错（磁盘满、没有权限、文件被占用）时这批数据放回队列稍后重试，
+    并通过 write_failed 通知界面；恢复后发出 write_recovered。
+    """
+    compaction_due = Signal()
+    archive_written = Signal(int)  # 本次追加到归档的行数（任务和墓碑）
+    write_failed = Signal(str)
+    write_recovered = Signal()
+
+    DEBOUNCE_MS = int(os.getenv("TODO_SAVE_DEBOUNCE_MS", "300"))
+    MAX_DELAY_FACTOR = 5  # 持续修改时最多推迟 debounce * 5 后强制写入
+    RETRY_SECONDS = 2.0
+    STOP_RETRIES = 3  # 退出时最多再试几次，仍然失败就放弃
+
+    def __init__(self, debounce_ms=None, parent=None):
+        super().__init__(parent)
+        self.debounce = (self.DEBOUNCE_MS if debounce_ms is None else debounce_ms) / 1000
+        self._cond = threading.Condition()
+        self._records = []
+        self._snapshot = None
+        self._archive = []
+        self._tombstones = []
+        self._generation = 0
+        self._stopping = False
+        self.flushed = True  # 退出时是否所有数据都已写入
+
+    def submit(self, record):
+        with self._cond:
+            self._records.append(record)
+            self._generation += 1
+            self._cond.notify()
+
+    def submit_snapshot(self, todos):
+        """提交完整快照；它覆盖之前所有尚未写入的记录"""
+        with self._cond:
+            self._snapshot = todos
+            self._records = []
+            self._generation += 1
+            self._cond.notify()
+
+    def submit_archive(self, todos):
+        """提交要追加到归档的任务；同一批里先写归档，再写删除它们的记录"""
+        with self._cond:
+            self._archive.extend(todos)
+            self._generation += 1
+            self._cond.notify()
+
+    def submit_tombstones(self, ids):
+        """提交离开归档的任务 id；写在同一批的记录之后，恢复的任务不会因崩溃两头落空"""
+        with self._cond:
+            self._tombstones.extend({"id": task_id, "deleted": True} for task_id in ids)
+            self._generation += 1
+            self._cond.notify()
+
+    def stop(self):
+        """请求退出并等待剩余数据写完；返回是否全部写入成功"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self.wait()
+        return self.flushed
+
+    def run(self):
+        failures = 0
+        while True:
+            with self._cond:
+                while not self._has_pending() and not self._stopping:
+                    self._cond.wait()
+                if failures:
+                    # 出错后稍等再试；退出时缩短等待，不让关闭窗口卡住太久
+                    self._cond.wait(0.2 if self._stopping else self.RETRY_SECONDS)
+                else:
+                    self._wait_for_quiet()
+                snapshot, records, archive = self._snapshot, self._records, self._archive
+                tombstones = self._tombstones
+                self._snapshot, self._records, self._archive = None, [], []
+                self._tombstones = []
+                stopping = self._stopping
+
+            try:
+                if archive:
+                    ArchiveStore.append(archive)
+                    self.archive_written.emit(len(archive))
+                    archive = []
+                if snapshot is not None:
+                    DataManager.save_todos(snapshot)
+                    snapshot = None
+                if records:
+                    compact = DataManager.append_records(records)
+                    records = []
+                    if compact:
+                        self.compaction_due.emit()
+                if tombstones:
+                    ArchiveStore.append(tombstones)
+                    self.archive_written.emit(len(tombstones))
+            except (OSError, sqlite3.Error) as e:
+                failures += 1
+                with self._cond:
+                    self._requeue(snapshot, records, archive, tombstones)
+                self.write_failed.emit(str(e))
+                if stopping and failures > self.STOP_RETRIES:
+                    self.flushed = False
+                    return
+                continue
+            if failures:
+                failures = 0
+                self.write_recovered.emit()
+            if stopping:
+                return
+
+    def _requeue(self, snapshot, records, archive, tombstones):
+        """把没写成功的部分放回队首（调用时已持有锁）；之后提交的新快照覆盖快照和记录"""
+        self._archive = archive + self._archive
+        self._tombstones = tombstones + self._tombstones
+        if self._snapshot is None:
+            self._snapshot = snapshot
+            self._records = records + self._records
+
+    def _has_pending(self):
+        return (self._snapshot is not None or bool(self._records) or bool(self._archive)
+                or bool(self._tombstones))
+
+    def _wait_for_quiet(self):
+        """等到 debounce 窗口内不再有新提交（调用时已持有锁）"""
+        hard_deadline = time.monotonic() + self.debounce * self.MAX_DELAY_FACTOR
+        while not self._stopping:
+            generation = self._generation
+            timeout = min(self.debounce, hard_deadline - time.monotonic())
+            if timeout <= 0:
+                return
+            self._cond.wait(timeout)
+            if self._generation == generation:
+                return
+
+
+class TaskLoader(QThread):
+    """后台分页加载任务
+
+    SQLite 后端按视图以键集分页读取（当前视图优先）；JSON 后端用 JsonTaskStream
+    边解析边交给 UI。每页之间会稍作停顿，让出 CPU 给界面；列表滚动到底部时调用 request_more()
+    可以跳过停顿，立即读取下一页。
+    """
+    chunk_loaded = Signal(list)
+
+    PAGE_SIZE = 200
+    IDLE_PAUSE_MS = 5
+
+    def __init__(self, first_view="active", after=None, parent=None):
+        super().__init__(parent)
+        self.first_view = first_view
+        self.after = after
+        self.needs_snapshot = False
+        self._demand = threading.Event()
+
+    def request_more(self):
+        self._demand.set()
+
+    def run(self):
+        if DataManager.BACKEND == "sqlite":
+            self._load_sqlite()
+            return
+        stream = JsonTaskStream(self.PAGE_SIZE)
+        for chunk in stream:
+            if self.isInterruptionRequested():
+                return
+            self.chunk_loaded.emit(chunk)
+            self._pause()
+        self.needs_snapshot = stream.migrated
+
+    def _pause(self):
+        self._demand.wait(self.IDLE_PAUSE_MS / 1000)
+        self._demand.clear()
+
+    def _load_sqlite(self):
+        store = SQLiteStore.shared()
+        other = "completed" if self.first_view == "active" else "active"
+        for view, after in ((self.first_view, self.after), (other, None)):
+            while not self.isInterruptionRequested():
+                page = store.query_view("completed" if view == "completed" else "all",
+                                        self.PAGE_SIZE, after=after)
+                if page:
+                    self.chunk_loaded.emit(page)
+                if len(page) < self.PAGE_SIZE:
+                    break
+                after = (page[-1].order, page[-1].id)
+                self._pause()
+
+
+class ArchiveReader(QThread):
+    """按需分页读取归档
+
+    只有已完成视图滚动到活跃任务末尾时才会启动；每次 request_more() 读一页。
+    skip_ids 是当前活跃任务的 id（归档后又恢复的任务）。归档只追加，恢复、修改后
+    再次归档的任务会出现多次：先扫一遍记下每个 id 最后出现的行，只产出最新的一份；
+    最后一行是墓碑的任务已被恢复或删除，不再产出。
+    """
+    page_loaded = Signal(list)
+    finished_reading = Signal()
+
+    PAGE_SIZE = 100
+
+    def __init__(self, skip_ids=(), first_seq=1, parent=None):
+        super().__init__(parent)
+        self.skip_ids = set(skip_ids)
+        self.next_seq = first_seq
+        self._demand = threading.Event()
+
+    def request_more(self):
+        self._demand.set()
+
+    def run(self):
+        latest = {}  # id -> 最后一次出现的行号
+        for line_no, data in enumerate(ArchiveStore.iter_tasks()):
+            if self.isInterruptionRequested():
+                return
+            latest[data.get("id")] = line_no
+        page = []
+        for line_no, data in enumerate(ArchiveStore.iter_tasks()):
+            if self.isInterruptionRequested():
+                return
+            task_id = data.get("id")
+            if (task_id is None or data.get("deleted") or task_id in self.skip_ids
+                    or latest.get(task_id) != line_no):
+                continue
+            task = Task.from_dict(data)
+            task.archive_seq = self.next_seq
+            self.next_seq += 1
+            page.append(task)
+            if len(page) >= self.PAGE_SIZE:
+                if not self._wait_for_demand():
+                    return
+                self.page_loaded.emit(page)
+                page = []
+        if page and self._wait_for_demand():
+            self.page_loaded.emit(page)
+        self.finished_reading.emit()
+
+    def _wait_for_demand(self):
+        """等待下一次 request_more()；被中断时返回 False"""
+        while not self._demand.wait(0.1):
+            if self.isInterruptionRequested():
+                return False
+        self._demand.clear()
+        return not self.isInterruptionRequested()
+
+
+PRIORITY_RANK = {"high": 0, "medium": 1, "low": 2, "none": 3}
+
+
+def priority_sort_key(task):
+    """按优先级排序时的键：先优先级，同级内保持手动顺序；归档任务排在最后"""
+    return task.archive_seq, PRIORITY_RANK[task.priority], task.order, task.id
+
+
+def task_sort_key(task):
+    """视图内的排序键；id 保证内容相同的任务也有确定的先后
+
+    归档任务 (archive_seq > 0) 按读取顺序排在所有活跃任务之后。
+    """
+    return task.archive_seq, task.order, task.id
+
+
+class SortedTaskIndex:
+    """按排序键（默认 task_sort_key）排好序的任务集合，查找 / 增删定位都是 O(log n)
+
+    键在加入时记录下来；修改任务中参与排序的字段之前需要先 remove，改完再 add。
+    """
+
+    def __init__(self, tasks=(), key=task_sort_key):
+        self.key = key
+        self._tasks = sorted(tasks, key=key)
+        self._keys = [key(t) for t in self._tasks]
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def tasks(self):
+        return self._tasks
+
+    def head(self, n):
+        return self._tasks[:n]
+
+    def add(self, task):
+        key = self.key(task)
+        pos = bisect.bisect_right(self._keys, key)
+        self._keys.insert(pos, key)
+        self._tasks.insert(pos, task)
+        return pos
+
+    def remove(self, task):
+        pos = self.position(task)
+        if pos >= 0:
+            del self._keys[pos]
+            del self._tasks[pos]
+        return pos
+
+    def position(self, task):
+        key = self.key(task)
+        pos = bisect.bisect_left(self._keys, key)
+        if pos < len(self._tasks) and self._tasks[pos] is task:
+            return pos
+        return -1
+
+
+class TextSearchIndex:
+    """任务文字的单字 + 字符二元组 (bigram) 倒排索引
+
+    按字符而不是按词切分，中文不需要分词也能检索。单个字符的查询直接取单字
+    倒排；更长的查询取各 bigram 的倒排集合求交（从最小的开始），三个字符
+    以上再用子串匹配去掉误命中。
+    """
+
+    def __init__(self, tasks=()):
+        self._postings = {}
+        for task in tasks:
+            self.add(task)
 
-        # 在按钮下方显示菜单
-        pos = self.flag_btn.mapToGlobal(QPoint(0, self.flag_btn.height()))
-        menu.exec(pos)
+    @staticmethod
+    def normalize(text):
+        return text.casefold()
+
+    @staticmethod
+    def _grams(text):
+        """建索引用：所有单字和 bigram"""
+        return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+    @staticmethod
+    def _query_grams(query):
+        return {query} if len(query) == 1 else {query[i:i + 2] for i in range(len(query) - 1)}
+
+    def add(self, task):
+        for gram in self._grams(self.normalize(task.text)):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = set()
+            postings.add(task)
+
+    def remove(self, task):
+        for gram in self._grams(self.normalize(task.text)):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(task)
+                if not postings:
+                    del self._postings[gram]
+
+    def candidates(self, query):
+        """可能包含 query（已 normalize）的任务集合；query 不超过两个字符时就是精确结果
+
+        只有一个 gram 时直接返回倒排集合本身，调用方不要修改它。
+        """
+        candidates = None
+        for postings in sorted((self._postings.get(g, ()) for g in self._query_grams(query)), key=len):
+            candidates = postings if candidates is None else candidates & postings
+            if not candidates:
+                return set()
+        return candidates if candidates is not None else set()
+
+
+def _longest_increasing_subsequence(seq):
+    """返回 seq 中某个最长严格递增子序列的取值集合，O(n log n)"""
+    tails = []      # tails[k]: 长度为 k+1 的递增子序列的末尾下标
+    parents = [-1] * len(seq)
+    for i, value in enumerate(seq):
+        k = bisect.bisect_left(tails, value, key=seq.__getitem__)
+        if k > 0:
+            parents[i] = tails[k - 1]
+        if k == len(tails):
+            tails.append(i)
+        else:
+            tails[k] = i
+    result = set()
+    i = tails[-1] if tails else -1
+    while i >= 0:
+        result.add(seq[i])
+        i = parents[i]
+    return result
+
+
+class _FenwickCounter:
+    """树状数组：单点加减、前缀求和都是 O(log n)"""
+
+    def __init__(self, counts):
+        self._tree = [0] + list(counts)
+        for i in range(1, len(self._tree)):
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    def add(self, index, delta):
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index):
+        """下标 0..index（含）的和"""
+        total, i = 0, index + 1
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+
+class TaskListModel(QAbstractListModel):
+    """当前视图中显示的任务（直接引用 MainWindow.task_index 中的 Task），按 sort_key 排列"""
+    TaskRole = Qt.UserRole + 1
+    MIME_TYPE = "application/x-zendo-task-rows"
+
+    more_requested = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._tasks = []
+        self._has_more = False
+        self.sort_key = task_sort_key
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._tasks)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        task = self._tasks[index.row()]
+        if role == Qt.DisplayRole:
+            return task.text
+        if role == Qt.ToolTipRole:
+            return f"{task.text}\nDue: {task.due}" if task.due else task.text
+        if role == self.TaskRole:
+            return task
+        return None
 
-    def change_priority(self, new_priority):
-        """改变优先级"""
-        self.priority = new_priority
-        self.flag_btn.setText(PRIORITY_CONFIG[new_priority]["flag"])
-        self.flag_btn.setToolTip(PRIORITY_CONFIG[new_priority]["label"])
-        if self.on_priority_change:
-            self.on_priority_change(new_priority)
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled
+
+    def supportedDropActions(self):
+        return Qt.MoveAction
+
+    def mimeTypes(self):
+        return [self.MIME_TYPE]
+
+    def mimeData(self, indexes):
+        mime = QMimeData()
+        rows = ",".join(str(index.row()) for index in indexes)
+        mime.setData(self.MIME_TYPE, rows.encode())
+        return mime
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more
+
+    def fetchMore(self, parent=QModelIndex()):
+        """滚动到底部：请求加载线程尽快读下一页"""
+        self.more_requested.emit()
+
+    def set_has_more(self, has_more):
+        self._has_more = has_more
+
+    def tasks(self):
+        return self._tasks
+
+    def task_at(self, row):
+        return self._tasks[row]
+
+    def set_tasks(self, tasks):
+        self.beginResetModel()
+        self._tasks = list(tasks)
+        self.endResetModel()
+
+    def update_tasks(self, tasks):
+        """增量更新到新的任务序列
+
+        只发出最少的删除 / 插入 / 移动通知：先成段删除不再显示的行，
+        再以最长递增子序列 (LIS) 作为不动的行，其余行逐个移动或插入到
+        它在新序列中前一个任务的后面。选中项和滚动位置因此得以保留。
+
+        移动 / 插入的目标行和源行用树状数组推算，不必逐行查找：
+        每一行记在一个“锚点”上——没动过的行锚在自己删除后的下标，
+        移过来或新插入的行锚在它前面最近的不动行（开头之前的记为 -1）。
+        行号就是锚点更靠前的行数。
+        """
+        tasks = list(tasks)
+        new_pos = {id(t): i for i, t in enumerate(tasks)}
+        kept = sum(1 for t in self._tasks if id(t) in new_pos)
+        if kept * 2 < len(self._tasks) or kept * 2 < len(tasks):
+            # 大部分行都要删除或新增（切换视图、输入 / 清空搜索）：整体重置比逐段通知更快
+            self.set_tasks(tasks)
+            return
+
+        # 1. 自下而上成段删除
+        row = len(self._tasks) - 1
+        while row >= 0:
+            if id(self._tasks[row]) in new_pos:
+                row -= 1
+                continue
+            end = row
+            while row >= 0 and id(self._tasks[row]) not in new_pos:
+                row -= 1
+            self.beginRemoveRows(QModelIndex(), row + 1, end)
+            del self._tasks[row + 1:end + 1]
+            self.endRemoveRows()
+
+        # 2. 保留行中相对顺序已正确的部分不动
+        old_row = {id(t): row for row, t in enumerate(self._tasks)}
+        stable = _longest_increasing_subsequence([new_pos[id(t)] for t in self._tasks])
+
+        # 3. 按新顺序把其余的行放到前一个任务之后；锚点下标整体 +1，给“开头”留出 0
+        anchors = _FenwickCounter([0] + [1] * len(self._tasks))
+        anchor = 0
+        i = 0
+        while i < len(tasks):
+            if i in stable:
+                anchor = old_row[id(tasks[i])] + 1
+                i += 1
+                continue
+            dst = anchors.prefix(anchor)
+            src_anchor = old_row.get(id(tasks[i]))
+            if src_anchor is not None:
+                src = anchors.prefix(src_anchor)  # 锚点在它之前的行数（不含它自己）
+                anchors.add(src_anchor + 1, -1)
+                anchors.add(anchor, 1)
+                self.move_row(src, dst - 1 if src < dst else dst)
+                i += 1
+            else:
+                end = i
+                while end < len(tasks) and id(tasks[end]) not in old_row:
+                    end += 1
+                self.beginInsertRows(QModelIndex(), dst, dst + end - i - 1)
+                self._tasks[dst:dst] = tasks[i:end]
+                self.endInsertRows()
+                anchors.add(anchor, end - i)
+                i = end
+
+    def insert_task(self, row, task):
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._tasks.insert(row, task)
+        self.endInsertRows()
+
+    def insert_sorted(self, tasks):
+        """按排序键插入一批任务；整批都排在末尾时（分页加载的常见情况）只发一次通知"""
+        tasks = sorted(tasks, key=self.sort_key)
+        if not tasks:
+            return
+        if not self._tasks or self.sort_key(tasks[0]) > self.sort_key(self._tasks[-1]):
+            row = len(self._tasks)
+            self.beginInsertRows(QModelIndex(), row, row + len(tasks) - 1)
+            self._tasks.extend(tasks)
+            self.endInsertRows()
+            return
+        for task in tasks:
+            self.insert_task(self.insert_position(task), task)
+
+    def insert_position(self, task):
+        return bisect.bisect_right(self._tasks, self.sort_key(task), key=self.sort_key)
+
+    def remove_task(self, task):
+        row = self.row_of(task)
+        if row >= 0:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._tasks[row]
+            self.endRemoveRows()
+
+    def row_of(self, task):
+        """行始终按 sort_key 排列，二分查找即可"""
+        row = bisect.bisect_left(self._tasks, self.sort_key(task), key=self.sort_key)
+        if row < len(self._tasks) and self._tasks[row] is task:
+            return row
+        return self._find_row(task)  # 兜底：键已被修改但行还没移动
+
+    def _find_row(self, task):
+        for i, t in enumerate(self._tasks):
+            if t is task:
+                return i
+        return -1
+
+    def reposition(self, task, old_row):
+        """任务的排序键变了：把它从 old_row 移到新位置（只移动这一行）"""
+        if not 0 <= old_row < len(self._tasks):
+            return
+        self._tasks.pop(old_row)
+        new_row = self.insert_position(task)
+        self._tasks.insert(old_row, task)
+        if not self.move_row(old_row, new_row):
+            self.task_changed(task)
+
+    def remove_tasks(self, tasks):
+        """删除多行：按连续区段自下而上删除，每段只发一次通知"""
+        rows = sorted((row for row in map(self.row_of, tasks) if row >= 0), reverse=True)
+        i = 0
+        while i < len(rows):
+            end = start = rows[i]
+            while i + 1 < len(rows) and rows[i + 1] == start - 1:
+                i += 1
+                start = rows[i]
+            self.beginRemoveRows(QModelIndex(), start, end)
+            del self._tasks[start:end + 1]
+            self.endRemoveRows()
+            i += 1
+
+    def tasks_changed(self, tasks):
+        """多行内容变化：只发一次覆盖这些行的 dataChanged"""
+        rows = [row for row in map(self.row_of, tasks) if row >= 0]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)))
+
+    def task_changed(self, task):
+        """只通知变化的那一行重绘"""
+        row = self.row_of(task)
+        if row >= 0:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def move_row(self, src, dst):
+        """把 src 行移动到 dst（dst 为移动完成后的位置）"""
+        if src == dst or not 0 <= src < len(self._tasks) or not 0 <= dst < len(self._tasks):
+            return False
+        qt_dst = dst + 1 if dst > src else dst
+        self.beginMoveRows(QModelIndex(), src, src, QModelIndex(), qt_dst)
+        self._tasks.insert(dst, self._tasks.pop(src))
+        self.endMoveRows()
+        return True
+
+
+class TaskItemDelegate(QStyledItemDelegate):
+    """直接绘制任务行，不为每一行创建控件
+
+    布局与原先的任务行一致：拖拽手柄、复选框、文字、优先级旗帜、删除按钮。
+    字体和画笔只在构造时创建一次，所有行共享。
+    """
+    toggle_requested = Signal(int)
+    delete_requested = Signal(int)
+    priority_requested = Signal(int, QPoint)
+
+    ROW_HEIGHT = 38
+    ROW_SPACING = 4
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.text_font = QFont("Segoe UI", 9)
+        self.done_font = QFont(self.text_font)
+        self.done_font.setStrikeOut(True)
+        self.text_metrics = QFontMetrics(self.text_font)
+        self.handle_font = QFont("Segoe UI")
+        self.handle_font.setPixelSize(13)
+        self.handle_font.setBold(True)
+        self.icon_font = QFont("Segoe UI")
+        self.icon_font.setPixelSize(14)
+        self.delete_font = QFont(self.icon_font)
+        self.delete_font.setBold(True)
+
+        self.border_pen = QPen(QColor(0, 0, 0, 10))
+        self.idle_border_pen = QPen(QColor(255, 255, 255, 100))
+        self.box_pen = QPen(QColor("#ccc"))
+        self.check_pen = QPen(QColor("white"), 2)
+        self.check_pen.setCapStyle(Qt.RoundCap)
+        self.check_pen.setJoinStyle(Qt.RoundJoin)
+
+    def sizeHint(self, option, index):
+        return QSize(0, self.ROW_HEIGHT + self.ROW_SPACING)
+
+    @classmethod
+    def layout_rects(cls, rect):
+        """计算一行中各部分的位置（绘制和点击检测共用）"""
+        row = QRect(rect.left(), rect.top(), rect.width(), cls.ROW_HEIGHT)
+        inner = row.adjusted(8, 5, -8, -5)
+        cy = inner.center().y()
+        handle = QRect(inner.left(), inner.top(), 16, inner.height())
+        checkbox = QRect(handle.right() + 9, cy - 7, 16, 16)
+        delete = QRect(inner.right() - 19, cy - 9, 20, 20)
+        flag = QRect(delete.left() - 8 - 24, cy - 11, 24, 24)
+        text = QRect(checkbox.right() + 9, inner.top(),
+                     flag.left() - 8 - checkbox.right() - 9, inner.height())
+        return {"row": row, "handle": handle, "checkbox": checkbox,
+                "text": text, "flag": flag, "delete": delete}
+
+    def paint(self, painter, option, index):
+        task = index.data(TaskListModel.TaskRole)
+        if task is None:
+            return
+        rects = self.layout_rects(option.rect)
+        selected = bool(option.state & QStyle.State_Selected)
+        hovered = bool(option.state & QStyle.State_MouseOver)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        # 行背景
+        alpha = 255 if selected else (220 if hovered else 150)
+        painter.setPen(self.border_pen if selected else self.idle_border_pen)
+        painter.setBrush(QColor(255, 255, 255, alpha))
+        painter.drawRoundedRect(rects["row"].adjusted(0, 0, -1, -1), 6, 6)
 
-    def update_style(self, completed):
+        # 拖拽手柄
+        painter.setFont(self.handle_font)
+        painter.setPen(QColor("#ddd"))
+        painter.drawText(rects["handle"], Qt.AlignCenter, "⋮⋮")
+
+        # 复选框
+        completed = task.completed
+        box = rects["checkbox"]
+        if completed:
+            painter.setPen(QColor("#007AFF"))
+            painter.setBrush(QColor("#007AFF"))
+        else:
+            painter.setPen(self.box_pen)
+            painter.setBrush(QColor("white"))
+        painter.drawRoundedRect(box.adjusted(0, 0, -1, -1), 4, 4)
         if completed:
-            self.label.setStyleSheet("color: #aaa; text-decoration: line-through;")
+            path = QPainterPath()
+            path.moveTo(box.left() + 4, box.center().y())
+            path.lineTo(box.left() + 7, box.bottom() - 4)
+            path.lineTo(box.right() - 3, box.top() + 4)
+            painter.setPen(self.check_pen)
+            painter.setBrush(Qt.NoBrush)
+            painter.drawPath(path)
+
+        # 文字
+        font = self.done_font if completed else self.text_font
+        painter.setFont(font)
+        painter.setPen(QColor("#aaa") if completed else QColor("#333"))
+        text = self.text_metrics.elidedText(task.text, Qt.ElideRight, rects["text"].width())
+        painter.drawText(rects["text"], Qt.AlignVCenter | Qt.AlignLeft, text)
+
+        # 优先级旗帜
+        painter.setFont(self.icon_font)
+        painter.setPen(QColor(PRIORITY_CONFIG[task.priority]["color"]))
+        painter.drawText(rects["flag"], Qt.AlignCenter, PRIORITY_CONFIG[task.priority]["flag"])
+
+        # 删除按钮（悬停时高亮）
+        painter.setFont(self.delete_font)
+        if hovered:
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QColor(255, 59, 48, 25))
+            painter.drawRoundedRect(rects["delete"], 3, 3)
+            painter.setPen(QColor("#ff3b30"))
         else:
-            self.label.setStyleSheet("color: #333; text-decoration: none;")
+            painter.setPen(QColor("#bbb"))
+        painter.drawText(rects["delete"], Qt.AlignCenter, "✕")
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        """点击复选框 / 旗帜 / 删除按钮"""
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease,
+                                QEvent.MouseButtonDblClick):
+            return False
+        if event.button() != Qt.LeftButton:
+            return False
+
+        pos = event.position().toPoint()
+        rects = self.layout_rects(option.rect)
+        for part in ("checkbox", "flag", "delete"):
+            if rects[part].contains(pos):
+                break
+        else:
+            return False
+
+        # 按下时也吞掉事件，避免在按钮上开始拖拽
+        if event.type() == QEvent.MouseButtonRelease:
+            row = index.row()
+            if part == "checkbox":
+                self.toggle_requested.emit(row)
+            elif part == "delete":
+                self.delete_requested.emit(row)
+            else:
+                widget = option.widget
+                anchor = QPoint(rects["flag"].left(), rects["flag"].bottom())
+                self.priority_requested.emit(row, widget.mapToGlobal(anchor) if widget else anchor)
+        return True
 
 
-class DraggableListWidget(QListWidget):
-    """支持拖拽排序的列表控件"""
+class DraggableListView(QListView):
+    """支持拖拽排序的列表视图"""
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setDragDropMode(QListWidget.InternalMove)
+        self.setDragDropMode(QAbstractItemView.InternalMove)
         self.setDefaultDropAction(Qt.MoveAction)
-        self.setSelectionMode(QListWidget.SingleSelection)
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)  # Ctrl / Shift 多选
         self.setAcceptDrops(True)
         self.setDragEnabled(True)
+        self.setDropIndicatorShown(True)
+        self.setMouseTracking(True)
+        self.setUniformItemSizes(True)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
 
     def dropEvent(self, event):
-        """处理拖放事件"""
-        super().dropEvent(event)
+        """处理拖放事件：只移动模型中的一行，而不是让视图删除再插入"""
+        selected = self.selectionModel().selectedRows()
+        if event.source() is not self or len(selected) != 1:
+            event.ignore()  # 只支持单行拖拽
+            return
+
+        src = selected[0].row()
+        target = self.indexAt(event.position().toPoint())
+        if not target.isValid():
+            dst = self.model().rowCount() - 1
+        else:
+            dst = target.row()
+            if self.dropIndicatorPosition() == QAbstractItemView.BelowItem:
+                dst += 1
+            if dst > src:
+                dst -= 1
+
+        # IgnoreAction：告诉拖拽源不要再删除原来的行
+        event.setDropAction(Qt.IgnoreAction)
+        event.accept()
+        self.stopAutoScroll()
+
         main_window = self.get_main_window()
         if main_window:
-            main_window.update_task_order()
+            main_window.move_task(src, dst)
 
     def get_main_window(self):
         """获取主窗口引用"""
@@ -322,6 +1497,17 @@ class DraggableListWidget(QListWidget):
 
 
 class MainWindow(QMainWindow):
+    loading_finished = Signal()
+
+    ORDER_GAP = 1024  # 相邻任务 order 的初始间隔，拖拽时取两邻居的中点
+    # 每个桶都是一个有序索引；侧边栏视图直接对应其中一个桶
+    VIEW_BUCKETS = ("active", "completed", "today") + tuple(f"priority:{key}" for key in PRIORITY_CONFIG)
+    FILTER_BUCKETS = {"all": "active", "today": "today", "completed": "completed"}
+    PRIORITY_PREFIX = "by_priority:"  # 按优先级排序模式下额外维护的桶
+    TOP_TASKS = 3  # 侧边栏 "Up next" 显示的任务数
+    SEARCH_PAGE = 200  # 搜索结果每页行数
+    SEARCH_SORT_MAX = 2000  # 候选不超过这么多时直接排序，否则按视图顺序扫描
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("ZenDo")
@@ -332,12 +1518,46 @@ class MainWindow(QMainWindow):
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowMinMaxButtonsHint)
         self.setAttribute(Qt.WA_TranslucentBackground)
 
-        # 数据初始化
-        self.todos = DataManager.load_todos()
+        # 数据初始化：先显示窗口，任务由 TaskLoader 分页加载
+        self.task_index = {}
+        self.today = date.today().isoformat()
+        self.views = {key: SortedTaskIndex() for key in self.VIEW_BUCKETS}
         self.current_filter = "all"
+        self.search_query = ""
+        self.search_limit = self.SEARCH_PAGE
+        self.search_has_more = False  # 搜索结果还有没显示出来的页
+        self.sort_by_priority = False
+        self.search_index = TextSearchIndex()  # 随加载 / 增删增量维护
+        self.loading = True
+        self._deleted_while_loading = set()
+        self._compact_pending = False
+        # 归档只在已完成视图滚动到底部时按页读取
+        self.archive_reader = None
+        self.archive_available = ArchiveStore.exists()
+        self.archive_exhausted = False
+        self._archive_pending = 0  # 已提交、尚未写入归档文件的任务数
+
+        # 启动之后的所有磁盘写入都交给后台线程
+        self.writer = PersistenceWriter(parent=self)
+        self.writer.compaction_due.connect(self.compact_storage)
+        self.writer.archive_written.connect(self.on_archive_written)
+        self.writer.write_failed.connect(self.on_write_failed)
+        self.writer.write_recovered.connect(lambda: self.save_error_label.setVisible(False))
+        self.writer.start()
 
         self.setup_ui()
-        self.refresh_list()
+        # 一轮事件里的多次修改只刷新一次 "Up next"
+        self.top_timer = QTimer(self)
+        self.top_timer.setSingleShot(True)
+        self.top_timer.timeout.connect(self.refresh_top_tasks)
+        # 先让窗口显示出来，下一轮事件循环再开始读数据
+        self.loader = None
+        self.set_loading_state(True)
+        QTimer.singleShot(0, self.start_loading)
+
+        self.date_timer = QTimer(self)
+        self.date_timer.timeout.connect(self.check_date_rollover)
+        self.date_timer.start(60 * 1000)
 
     def setup_ui(self):
         # 主容器
@@ -398,6 +1618,14 @@ class MainWindow(QMainWindow):
             self.menu_buttons[key] = btn
 
         self.menu_buttons["all"].setChecked(True)
+
+        # 优先级最高的几个未完成任务
+        top_title = QLabel("UP NEXT")
+        top_title.setStyleSheet("color: #aaa; font-size: 10px; font-weight: bold; padding-left: 4px; margin-top: 16px;")
+        self.sidebar_layout.addWidget(top_title)
+        self.top_label = QLabel()
+        self.top_label.setStyleSheet("color: #4a4a4a; font-size: 11px; padding-left: 4px;")
+        self.sidebar_layout.addWidget(self.top_label)
         self.sidebar_layout.addStretch()
 
         # 用户信息 (底部)
@@ -414,12 +1642,69 @@ class MainWindow(QMainWindow):
         # 标题
         self.title_label = QLabel("All Tasks")
         self.title_label.setStyleSheet("font-size: 20px; font-weight: bold; color: #333; margin-bottom: 3px;")
+        self.sort_button = QPushButton("Sort: Manual")
+        self.sort_button.setObjectName("MenuButton")
+        self.sort_button.setCheckable(True)
+        self.sort_button.setCursor(Qt.PointingHandCursor)
+        self.sort_button.clicked.connect(self.set_sort_by_priority)
+        self.clear_button = QPushButton("Archive completed")
+        self.clear_button.setObjectName("MenuButton")
+        self.clear_button.setCursor(Qt.PointingHandCursor)
+        self.clear_button.clicked.connect(self.archive_completed)
+        self.clear_button.setVisible(False)
+        title_layout = QHBoxLayout()
+        title_layout.addWidget(self.title_label)
+        title_layout.addStretch()
+        title_layout.addWidget(self.clear_button)
+        title_layout.addWidget(self.sort_button)
         self.date_label = QLabel("Overview • Drag to reorder")
         self.date_label.setStyleSheet("font-size: 11px; color: #999; margin-bottom: 12px;")
-
-        # 使用可拖拽的列表
-        self.list_widget = DraggableListWidget(self.content)
-        self.list_widget.setFocusPolicy(Qt.NoFocus)
+        self.save_error_label = QLabel()
+        self.save_error_label.setStyleSheet("font-size: 11px; color: #FF3B30; margin-bottom: 8px;")
+        self.save_error_label.setWordWrap(True)
+        self.save_error_label.setVisible(False)
+
+        # 搜索框：输入即过滤当前视图
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("🔍 Search tasks...")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self.search_tasks)
+
+        # 使用可拖拽的列表（模型/视图 + 自绘行）
+        self.model = TaskListModel(self)
+        self.delegate = TaskItemDelegate(self)
+        self.delegate.toggle_requested.connect(lambda row: self.toggle_task(self.model.task_at(row)))
+        self.delegate.delete_requested.connect(lambda row: self.delete_task(self.model.task_at(row)))
+        self.delegate.priority_requested.connect(
+            lambda row, pos: self.show_priority_menu(self.model.task_at(row), pos))
+
+        self.list_view = DraggableListView(self.content)
+        self.list_view.setModel(self.model)
+        self.list_view.setItemDelegate(self.delegate)
+        self.list_view.setFocusPolicy(Qt.NoFocus)
+        self.list_view.selectionModel().selectionChanged.connect(self.update_batch_bar)
+
+        # 多选后出现的批量操作栏
+        self.batch_bar = QWidget()
+        batch_layout = QHBoxLayout(self.batch_bar)
+        batch_layout.setContentsMargins(0, 0, 0, 6)
+        batch_layout.setSpacing(6)
+        self.batch_label = QLabel()
+        self.batch_label.setStyleSheet("font-size: 11px; color: #999;")
+        batch_layout.addWidget(self.batch_label)
+        batch_layout.addStretch()
+        self.batch_buttons = {}
+        for key, label, callback in [
+                ("complete", "✓ Complete", lambda: self.complete_tasks(self.selected_tasks())),
+                ("priority", "⚐ Priority", self.show_batch_priority_menu),
+                ("delete", "✕ Delete", lambda: self.delete_tasks(self.selected_tasks(include_archived=True)))]:
+            btn = QPushButton(label)
+            btn.setObjectName("MenuButton")
+            btn.setCursor(Qt.PointingHandCursor)
+            btn.clicked.connect(callback)
+            batch_layout.addWidget(btn)
+            self.batch_buttons[key] = btn
+        self.batch_bar.setVisible(False)
 
         # 输入框和优先级选择
         input_layout = QHBoxLayout()
@@ -437,9 +1722,12 @@ class MainWindow(QMainWindow):
         input_layout.addWidget(self.input_box, 1)
         input_layout.addWidget(self.priority_input)
 
-        self.content_layout.addWidget(self.title_label)
+        self.content_layout.addLayout(title_layout)
         self.content_layout.addWidget(self.date_label)
-        self.content_layout.addWidget(self.list_widget)
+        self.content_layout.addWidget(self.save_error_label)
+        self.content_layout.addWidget(self.search_box)
+        self.content_layout.addWidget(self.list_view)
+        self.content_layout.addWidget(self.batch_bar)
         self.content_layout.addLayout(input_layout)
 
         # 添加到主布局
@@ -466,99 +1754,525 @@ class MainWindow(QMainWindow):
 
         titles = {"all": "All Tasks", "today": "Today", "completed": "Completed"}
         self.title_label.setText(titles.get(view_key, "Tasks"))
+        self.clear_button.setVisible(view_key == "completed")
+        if view_key == "today":
+            self.date_label.setText(date.today().strftime("%A, %b %d") + " • Due & overdue")
+        else:
+            self.date_label.setText("Overview • Drag to reorder")
         self.refresh_list()
 
     def add_task(self):
         text = self.input_box.text().strip()
         if not text: return
 
-        new_task = {
-            "text": text,
-            "completed": False,
-            "category": "all",
-            "priority": self.priority_input.currentData(),
-            "order": len(self.todos)
-        }
-        self.todos.append(new_task)
-        DataManager.save_todos(self.todos)
+        new_task = Task(
+            id=DataManager.new_id(),
+            text=text,
+            completed=False,
+            category="all",
+            priority=self.priority_input.currentData(),
+            order=self.next_order(),
+            due=self.today if self.current_filter == "today" else None
+        )
+        self.task_index[new_task.id] = new_task
+        self.index_task(new_task)
+        self.search_index.add(new_task)
+        self.persist({"op": "add", "task": new_task.to_dict()})
         self.input_box.clear()
         self.priority_input.setCurrentIndex(0)
-        self.refresh_list()
-
-    def toggle_task(self, item_widget, task_data):
-        task_data["completed"] = item_widget.checkbox.isChecked()
-        item_widget.update_style(task_data["completed"])
-        DataManager.save_todos(self.todos)
-        if self.current_filter == "completed" and not task_data["completed"]:
-            self.refresh_list()
+        if self.in_current_view(new_task):
+            self.model.insert_task(self.model.insert_position(new_task), new_task)
+
+    def toggle_task(self, task_data):
+        if task_data.archive_seq:
+            self.restore_task(task_data)
+            return
+        self.unindex_task(task_data)
+        task_data.completed = not task_data.completed
+        task_data.completed_at = time.time() if task_data.completed else None
+        self.index_task(task_data)
+        self.model.task_changed(task_data)
+        self.persist({"op": "update", "id": task_data.id,
+                      "fields": {"completed": task_data.completed,
+                                 "completed_at": task_data.completed_at}})
+        if self.current_filter == "completed" and not task_data.completed:
+            self.model.remove_task(task_data)
+
+    def show_priority_menu(self, task_data, pos):
+        """显示优先级选择菜单"""
+        if task_data.archive_seq:
+            return  # 归档任务只读，恢复后才能修改
+        menu = QMenu(self)
+        for key in ["high", "medium", "low", "none"]:
+            action = menu.addAction(PRIORITY_CONFIG[key]["label"])
+            action.triggered.connect(lambda checked=False, k=key: self.change_priority(task_data, k))
+        menu.addSeparator()
+        if task_data.due == self.today:
+            menu.addAction("✕ Clear due date").triggered.connect(lambda: self.set_due(task_data, None))
+        else:
+            menu.addAction("📅 Due today").triggered.connect(lambda: self.set_due(task_data, self.today))
+        menu.exec(pos)
 
     def change_priority(self, task_data, new_priority):
-        task_data["priority"] = new_priority
-        DataManager.save_todos(self.todos)
+        old_row = self.model.row_of(task_data)
+        self.unindex_task(task_data)
+        task_data.priority = new_priority
+        self.index_task(task_data)
+        if self.sort_by_priority:
+            self.model.reposition(task_data, old_row)
+        else:
+            self.model.task_changed(task_data)
+        self.persist({"op": "update", "id": task_data.id,
+                      "fields": {"priority": new_priority}})
+
+    def set_due(self, task_data, due):
+        self.unindex_task(task_data)
+        task_data.due = due
+        self.index_task(task_data)
+        self.model.task_changed(task_data)
+        self.persist({"op": "update", "id": task_data.id, "fields": {"due": due}})
+        if self.current_filter == "today" and not self.in_current_view(task_data):
+            self.model.remove_task(task_data)
 
     def delete_task(self, task_data):
-        if task_data in self.todos:
-            self.todos.remove(task_data)
-            DataManager.save_todos(self.todos)
-            self.refresh_list()
+        self.delete_tasks([task_data])
 
-    def update_task_order(self):
-        """更新任务顺序（拖拽后调用）"""
-        task_map = {}
-        for task in self.todos:
-            key = (task["text"], task["completed"], task.get("priority", "none"))
-            task_map[key] = task
-
-        new_order = []
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            widget = self.list_widget.itemWidget(item)
-            if widget:
-                key = (widget.label.text(), widget.checkbox.isChecked(), widget.priority)
-                if key in task_map:
-                    task = task_map[key]
-                    task["order"] = i
-                    new_order.append(task)
-
-        displayed_tasks = set(id(t) for t in new_order)
-        for task in self.todos:
-            if id(task) not in displayed_tasks:
-                new_order.append(task)
-
-        self.todos = new_order
-        DataManager.save_todos(self.todos)
-
-    def refresh_list(self):
-        self.list_widget.clear()
-
-        filtered_data = []
-        if self.current_filter == "all":
-            filtered_data = [t for t in self.todos if not t["completed"]]
-        elif self.current_filter == "completed":
-            filtered_data = [t for t in self.todos if t["completed"]]
-        elif self.current_filter == "today":
-            filtered_data = [t for t in self.todos if not t["completed"]]
+    # --- 批量操作：一次写入、一次模型更新 ---
+    def selected_tasks(self, include_archived=False):
+        rows = sorted(index.row() for index in self.list_view.selectionModel().selectedRows())
+        return [task for task in map(self.model.task_at, rows)
+                if include_archived or not task.archive_seq]
 
-        filtered_data.sort(key=lambda x: x.get("order", 0))
+    def update_batch_bar(self):
+        count = len(self.list_view.selectionModel().selectedRows())
+        self.batch_bar.setVisible(count > 1)
+        self.batch_label.setText(f"{count} selected")
 
-        for task in filtered_data:
-            item = QListWidgetItem(self.list_widget)
-            item.setSizeHint(QSize(0, 38))
+    def show_batch_priority_menu(self):
+        menu = QMenu(self)
+        tasks = self.selected_tasks()
+        for key in ["high", "medium", "low", "none"]:
+            action = menu.addAction(PRIORITY_CONFIG[key]["label"])
+            action.triggered.connect(lambda checked=False, k=key: self.set_tasks_priority(tasks, k))
+        btn = self.batch_buttons["priority"]
+        menu.exec(btn.mapToGlobal(QPoint(0, btn.height())))
+
+    def complete_tasks(self, tasks, completed=True):
+        changed = [t for t in tasks if t.completed != completed]
+        if not changed:
+            return
+        completed_at = time.time() if completed else None
+        for task in changed:
+            self.unindex_task(task)
+            task.completed = completed
+            task.completed_at = completed_at
+            self.index_task(task)
+        self.persist_many([{"op": "update", "id": t.id,
+                            "fields": {"completed": completed, "completed_at": completed_at}}
+                           for t in changed])
+        self.model.tasks_changed(changed)
+        if self.current_filter == "completed" and not completed:
+            self.model.remove_tasks(changed)
+
+    def set_tasks_priority(self, tasks, priority):
+        changed = [t for t in tasks if t.priority != priority]
+        if not changed:
+            return
+        for task in changed:
+            self.unindex_task(task)
+            task.priority = priority
+            self.index_task(task)
+        self.persist_many([{"op": "update", "id": t.id, "fields": {"priority": priority}}
+                           for t in changed])
+        if self.sort_by_priority:
+            self.refresh_list()
+        else:
+            self.model.tasks_changed(changed)
+
+    def delete_tasks(self, tasks):
+        archived = [t for t in tasks if t.archive_seq]
+        if archived:
+            self.model.remove_tasks(archived)
+            self.submit_tombstones(archived)
+        deleted = [t for t in tasks if self.task_index.pop(t.id, None) is not None]
+        if not deleted:
+            return
+        for task in deleted:
+            if self.loading:
+                self._deleted_while_loading.add(task.id)
+            self.unindex_task(task)
+            self.search_index.remove(task)
+        self.persist_many([{"op": "delete", "id": t.id} for t in deleted])
+        self.model.remove_tasks(deleted)
+
+    # --- 归档 ---
+    def archive_completed(self):
+        self.archive_tasks(list(self.views["completed"].tasks()))
+
+    def archive_old_completed(self):
+        """把完成超过 ARCHIVE_AFTER_DAYS 天的任务移入归档，保持活跃数据集小
+
+        旧数据里已完成但没有 completed_at 的任务从现在开始计时。
+        """
+        days = ArchiveStore.ARCHIVE_AFTER_DAYS
+        if days <= 0 or self.loading:
+            return
+        now = time.time()
+        cutoff = now - days * 86400
+        unstamped, expired = [], []
+        for task in self.views["completed"].tasks():
+            if task.completed_at is None:
+                unstamped.append(task)
+            elif task.completed_at < cutoff:
+                expired.append(task)
+        for task in unstamped:
+            task.completed_at = now
+        if unstamped:
+            self.persist_many([{"op": "update", "id": t.id, "fields": {"completed_at": now}}
+                               for t in unstamped])
+        self.archive_tasks(expired)
+
+    def archive_tasks(self, tasks):
+        """移出活跃数据：后台线程先追加归档，再写删除记录"""
+        archived = [t for t in tasks if self.task_index.pop(t.id, None) is not None]
+        if not archived:
+            return
+        for task in archived:
+            self.unindex_task(task)
+            self.search_index.remove(task)
+        self._archive_pending += len(archived)
+        self.writer.submit_archive([t.to_dict() for t in archived])
+        self.persist_many([{"op": "delete", "id": t.id} for t in archived])
+        self.model.remove_tasks(archived)
+        self.archive_available = True
+        self.reset_archive_view()
+
+    def restore_task(self, task):
+        """把归档任务恢复为未完成；归档文件只追加，旧行由墓碑遮住"""
+        self.model.remove_task(task)
+        task.archive_seq = 0
+        task.completed = False
+        task.completed_at = None
+        self.task_index[task.id] = task
+        self.index_task(task)
+        self.search_index.add(task)
+        self.persist({"op": "add", "task": task.to_dict()})
+        self.submit_tombstones([task])
+
+    def submit_tombstones(self, tasks):
+        """任务离开归档：追加墓碑，之后从头读取归档时不再出现"""
+        self._archive_pending += len(tasks)
+        self.writer.submit_tombstones([t.id for t in tasks])
+
+    def on_archive_written(self, count):
+        self._archive_pending -= count
+        self.update_has_more()
+
+    def fetch_more(self):
+        if self.loading:
+            if self.loader is not None:
+                self.loader.request_more()
+        elif self.search_has_more:
+            self.search_limit += self.SEARCH_PAGE
+            self.refresh_list()
+        elif self.archive_can_fetch():
+            if self.archive_reader is None:
+                self.archive_reader = ArchiveReader(self.task_index.keys(), parent=self)
+                self.archive_reader.page_loaded.connect(self.add_archived_tasks)
+                self.archive_reader.finished_reading.connect(self.finish_archive)
+                self.archive_reader.start()
+            self.archive_reader.request_more()
+
+    def archive_can_fetch(self):
+        return (self.current_filter == "completed" and not self.search_query
+                and self.archive_available and not self.archive_exhausted
+                and not self._archive_pending)  # 等归档写完再读，否则会漏掉刚归档的任务
+
+    def update_has_more(self):
+        self.model.set_has_more(self.loading or self.search_has_more or self.archive_can_fetch())
+
+    def add_archived_tasks(self, tasks):
+        if self.sender() is not self.archive_reader:
+            return  # 已被 reset_archive_view 丢弃的读取线程
+        self.model.insert_sorted(tasks)
+
+    def finish_archive(self):
+        if self.sender() is self.archive_reader:
+            self.archive_exhausted = True
+            self.update_has_more()
+
+    def reset_archive_view(self):
+        """停止读取归档并移除已显示的归档行，下次滚动到底部时从头读取"""
+        if self.archive_reader is not None:
+            self.archive_reader.requestInterruption()
+            self.archive_reader.request_more()
+            self.archive_reader.wait()
+            self.archive_reader = None
+        tasks = self.model.tasks()
+        start = len(tasks)
+        while start and tasks[start - 1].archive_seq:  # 归档行总在末尾
+            start -= 1
+        if start < len(tasks):
+            self.model.remove_tasks(tasks[start:])
+        self.archive_exhausted = False
+        self.update_has_more()
+
+    def on_write_failed(self, message):
+        self.save_error_label.setText(f"⚠ Couldn't save changes, retrying: {message}")
+        self.save_error_label.setVisible(True)
+
+    def persist(self, record):
+        """把一次修改交给后台线程写入日志"""
+        self.writer.submit(record)
+        self.top_timer.start()
+
+    def persist_many(self, records):
+        """多条修改合成一条批量记录写入，回放时要么全部生效要么全部丢弃"""
+        if len(records) == 1:
+            self.persist(records[0])
+        else:
+            self.persist({"op": "batch", "records": records})
+
+    def compact_storage(self):
+        """日志过长时提交一份快照（复制一份，避免与 UI 线程的修改竞争）"""
+        if self.loading:
+            # 还没读完的任务不在内存里，此时写快照会丢数据
+            self._compact_pending = True
+            return
+        self.writer.submit_snapshot([t.to_dict() for t in self.task_index.values()])
+
+    def move_task(self, src, dst):
+        """拖拽后只给被移动的任务分配一个夹在新邻居之间的 order"""
+        rows = self.model.rowCount()
+        if any(0 <= row < rows and self.model.task_at(row).archive_seq for row in (src, dst)):
+            return  # 归档任务不参与排序
+        if not self.model.move_row(src, dst):
+            return
+        task = self.model.task_at(dst)
+        prev_order = self.model.task_at(dst - 1).order if dst > 0 else None
+        next_order = self.model.task_at(dst + 1).order if dst + 1 < self.model.rowCount() else None
+
+        if prev_order is None and next_order is None:
+            return
+        if prev_order is None:
+            new_order = next_order - self.ORDER_GAP
+        elif next_order is None:
+            new_order = prev_order + self.ORDER_GAP
+        else:
+            new_order = (prev_order + next_order) / 2
+            if not prev_order < new_order < next_order:
+                # 间隔已用尽（或旧数据里 order 相同）：整体重新拉开间隔
+                self.rebalance_orders()
+                return
+
+        self.set_order(task, new_order)
+        self.persist({"op": "update", "id": task.id, "fields": {"order": new_order}})
+
+    def set_order(self, task, new_order):
+        self.unindex_task(task)
+        task.order = new_order
+        self.index_task(task)
+
+    def rebalance_orders(self):
+        """按当前显示顺序和原有顺序，把所有任务的 order 重新编成等间隔"""
+        shown = {id(t) for t in self.model.tasks()}
+        # 显示中的任务按模型顺序依次填回它们原来占据的位置
+        shown_in_order = iter(self.model.tasks())
+        merged = [next(shown_in_order) if id(t) in shown else t
+                  for t in sorted(self.task_index.values(), key=task_sort_key)]
+
+        for i, task in enumerate(merged):
+            task.order = (i + 1) * self.ORDER_GAP
+        self.rebuild_views()
+        # 改动了所有任务的顺序，直接写一次快照
+        self.compact_storage()
+
+    # --- 视图索引 ---
+    def buckets_of(self, task):
+        """任务所属的桶：完成 / 未完成，未完成的再按优先级和是否今天到期细分"""
+        if task.completed:
+            keys = ("completed",)
+        elif task.due and task.due <= self.today:
+            keys = ("active", f"priority:{task.priority}", "today")
+        else:
+            keys = ("active", f"priority:{task.priority}")
+        if self.sort_by_priority:
+            keys += tuple(self.PRIORITY_PREFIX + key for key in keys if key in self.FILTER_BUCKETS.values())
+        return keys
+
+    def index_task(self, task):
+        for key in self.buckets_of(task):
+            self.views[key].add(task)
+
+    def unindex_task(self, task):
+        """修改任务的状态 / 优先级 / 顺序 / 截止日期之前调用，改完再 index_task"""
+        for key in self.buckets_of(task):
+            self.views[key].remove(task)
+
+    def rebuild_views(self):
+        """重新把所有任务分到各个有序索引里"""
+        buckets = {key: [] for key in self.VIEW_BUCKETS}
+        if self.sort_by_priority:
+            buckets.update({self.PRIORITY_PREFIX + key: [] for key in self.FILTER_BUCKETS.values()})
+        for task in self.task_index.values():
+            for key in self.buckets_of(task):
+                buckets[key].append(task)
+        self.views = {key: SortedTaskIndex(tasks, priority_sort_key if key.startswith(self.PRIORITY_PREFIX)
+                                           else task_sort_key)
+                      for key, tasks in buckets.items()}
+
+    def set_sort_by_priority(self, enabled):
+        """切换 "按优先级排序"：开启时才建立按 (优先级, order) 排序的桶"""
+        self.sort_by_priority = enabled
+        self.sort_button.setChecked(enabled)
+        self.sort_button.setText("Sort: Priority" if enabled else "Sort: Manual")
+        if enabled:
+            for key in self.FILTER_BUCKETS.values():
+                self.views[self.PRIORITY_PREFIX + key] = SortedTaskIndex(self.views[key].tasks(),
+                                                                         priority_sort_key)
+        else:
+            for key in self.FILTER_BUCKETS.values():
+                self.views.pop(self.PRIORITY_PREFIX + key, None)
+        # 优先级模式下拖拽无法表达跨优先级的移动，只在手动顺序下允许
+        self.list_view.setDragEnabled(not enabled and not self.loading)
+        self.refresh_list()
 
-            widget = TaskItemWidget(
-                task["text"],
-                task["completed"],
-                task.get("priority", "none"),
-                lambda state, t=task: None,
-                lambda t=task: self.delete_task(t),
-                lambda priority, t=task: self.change_priority(t, priority)
-            )
+    def top_priority_tasks(self, n):
+        """优先级最高的前 n 个未完成任务，按优先级逐桶取，不需要排序"""
+        result = []
+        for key in PRIORITY_RANK:
+            if len(result) >= n:
+                break
+            result.extend(self.views[f"priority:{key}"].head(n - len(result)))
+        return result
+
+    def refresh_top_tasks(self):
+        metrics = QFontMetrics(self.top_label.font())
+        lines = [metrics.elidedText(f"{PRIORITY_CONFIG[t.priority]['flag']} {t.text}", Qt.ElideRight, 130)
+                 for t in self.top_priority_tasks(self.TOP_TASKS)]
+        self.top_label.setText("\n".join(lines) or "Nothing queued")
+
+    def check_date_rollover(self):
+        """过了零点，"今天" 桶需要按新日期重建"""
+        today = date.today().isoformat()
+        if today != self.today:
+            self.today = today
+            self.rebuild_views()
+            if self.current_filter == "today":
+                self.refresh_list()
+            self.archive_old_completed()
+
+    def next_order(self):
+        """新任务排在所有任务之后"""
+        last = [self.views[key].tasks()[-1].order for key in ("active", "completed") if len(self.views[key])]
+        return max(last) + self.ORDER_GAP if last else self.ORDER_GAP
+
+    def in_current_view(self, task):
+        if self.current_filter == "completed":
+            in_view = task.completed
+        elif self.current_filter == "today":
+            in_view = not task.completed and bool(task.due) and task.due <= self.today
+        else:
+            in_view = not task.completed
+        if in_view and self.search_query:
+            return self.search_query in TextSearchIndex.normalize(task.text)
+        return in_view
 
-            widget.checkbox.stateChanged.disconnect()
-            widget.checkbox.stateChanged.connect(lambda state, w=widget, t=task: self.toggle_task(w, t))
+    def refresh_list(self):
+        """切换到当前视图的有序索引，只把差异应用到模型上"""
+        self.reset_archive_view()
+        bucket = self.FILTER_BUCKETS[self.current_filter]
+        if self.sort_by_priority:
+            bucket = self.PRIORITY_PREFIX + bucket
+            self.model.sort_key = priority_sort_key
+        else:
+            self.model.sort_key = task_sort_key
+        tasks = self.views[bucket].tasks()
+        self.search_has_more = False
+        if self.search_query:
+            tasks = self.search_results(tasks)
+        self.model.update_tasks(tasks)
+        self.update_has_more()
+
+    # --- 搜索 ---
+    def search_tasks(self, text):
+        self.search_query = TextSearchIndex.normalize(text.strip())
+        self.search_limit = self.SEARCH_PAGE
+        self.refresh_list()
 
-            self.list_widget.addItem(item)
-            self.list_widget.setItemWidget(item, widget)
+    def search_results(self, view_tasks):
+        """当前视图中匹配搜索词的前 search_limit 个任务，保持视图顺序；滚动到底部再显示下一页"""
+        query, limit = self.search_query, self.search_limit
+        candidates = self.search_index.candidates(query)
+        exact = len(query) <= 2
+        if len(candidates) <= self.SEARCH_SORT_MAX:
+            matches = [t for t in candidates if self.in_current_view(t)]
+            matches.sort(key=self.model.sort_key)
+        else:
+            # 命中很多（单字、常见 bigram）：按视图顺序找够一页就停，不对全部命中排序
+            matches = []
+            for t in view_tasks:
+                if t in candidates and (exact or query in TextSearchIndex.normalize(t.text)):
+                    matches.append(t)
+                    if len(matches) > limit:
+                        break
+        self.search_has_more = len(matches) > limit
+        return matches[:limit]
+
+    # --- 分页加载 ---
+    def start_loading(self):
+        """SQLite 后端同步读取首屏，其余交给后台线程；JSON 后端全部在后台读取"""
+        after = None
+        if DataManager.BACKEND == "sqlite":
+            first_page = SQLiteStore.shared().query_view("all", TaskLoader.PAGE_SIZE)
+            self.add_loaded_tasks(first_page)
+            if len(first_page) == TaskLoader.PAGE_SIZE:
+                after = (first_page[-1].order, first_page[-1].id)
+
+        self.set_loading_state(True)
+        self.loader = TaskLoader("active", after, parent=self)
+        self.loader.chunk_loaded.connect(self.add_loaded_tasks)
+        self.loader.finished.connect(self.finish_loading)
+        self.model.more_requested.connect(self.fetch_more)
+        self.loader.start()
+
+    def set_loading_state(self, loading):
+        """加载期间不能新建任务或拖拽排序（顺序依赖尚未读入的任务）"""
+        self.loading = loading
+        self.update_has_more()
+        self.input_box.setEnabled(not loading)
+        self.input_box.setPlaceholderText("Loading tasks..." if loading else "Add a task...")
+        self.list_view.setDragEnabled(not loading and not self.sort_by_priority)
+
+    def add_loaded_tasks(self, tasks):
+        shown = []
+        for task in tasks:
+            if task.id in self.task_index or task.id in self._deleted_while_loading:
+                continue  # 加载期间已经被修改 / 删除过
+            self.task_index[task.id] = task
+            self.index_task(task)
+            self.search_index.add(task)
+            if self.in_current_view(task):
+                shown.append(task)
+        self.model.insert_sorted(shown)
+
+    def finish_loading(self):
+        self.set_loading_state(False)
+        self._deleted_while_loading.clear()
+        if self._compact_pending or self.loader.needs_snapshot:
+            self._compact_pending = False
+            self.compact_storage()
+        self.archive_old_completed()
+        self.refresh_top_tasks()
+        self.loading_finished.emit()
+
+    def closeEvent(self, event):
+        if self.loader is not None:
+            self.loader.requestInterruption()
+            self.loader.wait()
+        self.reset_archive_view()
+        self.writer.stop()
+        super().closeEvent(event)
 
     # --- 窗口拖拽和调整大小逻辑 ---
     def mousePressEvent(self, event):
@@ -572,12 +2286,84 @@ class MainWindow(QMainWindow):
             event.accept()
 
 
+class StartupProfiler:
+    """--profile-startup：记录启动各阶段的时间点，结束时打印耗时分解
+
+    bubble.py 里有一份相同的副本：两个应用都是独立的单文件脚本，改动时两边一起改。
+    """
+
+    def __init__(self):
+        self.start = _IMPORT_START
+        self.marks = [("import PySide6", _IMPORT_END), ("module body", time.perf_counter())]
+        self._seen = set()
+
+    def mark(self, name):
+        if name not in self._seen:  # 同一阶段只记第一次
+            self._seen.add(name)
+            self.marks.append((name, time.perf_counter()))
+
+    def report(self, file=sys.stderr):
+        print(f"{'stage':<24}{'delta':>10}{'total':>10}", file=file)
+        prev = self.start
+        for name, t in self.marks:
+            print(f"{name:<24}{(t - prev) * 1000:>8.1f}ms{(t - self.start) * 1000:>8.1f}ms", file=file)
+            prev = t
+
+
+def profile_startup(profiler, window):
+    """首帧、首批任务和加载完成时打点，全部加载后打印并退出"""
+    QTimer.singleShot(0, lambda: profiler.mark("first event loop pass"))
+    window.model.rowsInserted.connect(lambda *_: profiler.mark("first rows"))
+    window.model.modelReset.connect(lambda: profiler.mark("first rows"))
+
+    def done():
+        profiler.mark("all tasks loaded")
+        profiler.report()
+        window.close()
+        QApplication.quit()
+    window.loading_finished.connect(done)
+
+
+def bench_task_memory(count=100_000):
+    """比较 dict 与 Task 两种表示下每个任务占用的内存（python tolist.py --bench-memory）"""
+    import tracemalloc
+
+    raw = json.dumps([{"id": uuid.uuid4().hex, "text": f"task {i}", "completed": i % 3 == 0,
+                       "category": "all", "priority": ("high", "medium", "low", "none")[i % 4],
+                       "order": i * 1024} for i in range(count)])
+    results = {}
+    for name, build in (("dict", lambda data: data),
+                        ("Task", lambda data: [Task.from_dict(task) for task in data])):
+        tracemalloc.start()
+        tasks = build(json.loads(raw))
+        results[name] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del tasks
+    for name, size in results.items():
+        print(f"{name:>5}: {size / 2 ** 20:7.1f} MiB  {size / count:6.0f} B/task")
+
+
 if __name__ == "__main__":
+    if "--bench-memory" in sys.argv:
+        bench_task_memory()
+        sys.exit(0)
+
+    profiler = StartupProfiler() if "--profile-startup" in sys.argv else None
+
     app = QApplication(sys.argv)
     app.setFont(QFont("Segoe UI", 9))
+    # 在创建任何控件之前设置全局样式表：控件创建时只解析、应用一次
     app.setStyleSheet(STYLESHEET)
+    if profiler:
+        profiler.mark("QApplication")
 
     window = MainWindow()
+    app.aboutToQuit.connect(window.writer.stop)  # 保证退出前写完
+    if profiler:
+        profiler.mark("MainWindow()")
+        profile_startup(profiler, window)
     window.show()
+    if profiler:
+        profiler.mark("show()")
 
     sys.exit(app.exec())
\ No newline at end of file